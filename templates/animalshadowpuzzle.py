@@ -16,7 +16,7 @@ import argparse
 from PIL import Image, ImageOps, ImageFilter
 from moviepy import *
 from vima5.canva import *
-from vima5.utils import make_voiceover, get_asset_path, get_build_path
+from vima5.utils import make_voiceover, make_voiceovers, get_asset_path, get_build_path
 from types import SimpleNamespace
 
 CANVA_WIDTH = 1920
@@ -245,11 +245,11 @@ def page_puzzle(movie, config, idx):
             obj_clip
             .with_duration(move_in_duration)
             .with_position((0, 0))
-            .with_effects([
+            .with_effects(fuse_effects([
                 Swing(-2, 2, 1),
                 SquishBounceEffect(frequency=1),
                 vfx.SlideIn(1, side='left'),
-            ]),
+            ])),
             start=started_at,
             duration=move_in_duration,
         )
@@ -293,10 +293,10 @@ def page_puzzle(movie, config, idx):
                 obj_clip
                 .with_duration(wait_wrong1_duration)
                 .with_position(init_pos)
-                .with_effects([
+                .with_effects(fuse_effects([
                     Swing(-2, 2, 1),
                     SquishBounceEffect(frequency=1),
-                ]),
+                ])),
                 start=attempted_at + move_to_wrong1_duration + move_from_wrong1_duration,
                 duration=wait_wrong1_duration,
             )
@@ -391,19 +391,21 @@ def parse_args():
     return args
 
 def gen_voiceovers(config):
+    host = config['host']['voice']
+    lines = []
     for obj in config['objects']:
-        print('Making voiceovers for:', obj['que_question'], obj['que_answer'])
-        make_voiceover(obj['que_question'], voice=config['host']['voice'])
-        make_voiceover(obj['que_answer'], voice=obj['voice'])
-        print('Making voiceovers for:', obj['congrats'])
-        make_voiceover(obj['congrats'], voice=config['host']['voice'])
-        print('Makeing voiceovers for:', obj['challenge_question'], obj.get('challenge_failed', ''), obj['challenge_success'])
-        make_voiceover(obj['challenge_question'], voice=config['host']['voice'])
+        lines += [
+            (obj['que_question'], host),
+            (obj['que_answer'], obj['voice']),
+            (obj['congrats'], host),
+            (obj['challenge_question'], host),
+            (obj['challenge_success'], host),
+            (obj['funfact'], obj['voice']),
+        ]
         if 'challenge_failed' in obj:
-            make_voiceover(obj['challenge_failed'], voice=config['host']['voice'])
-        make_voiceover(obj['challenge_success'], voice=config['host']['voice'])
-        print('Making voiceovers for:', obj['funfact'])
-        make_voiceover(obj['funfact'], voice=obj['voice'])
+            lines.append((obj['challenge_failed'], host))
+    print(f'Making voiceovers for {len(lines)} lines')
+    make_voiceovers(lines)
 
 def gen_level(config, idx):
     movie = Movie()
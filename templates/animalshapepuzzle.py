@@ -27,12 +27,12 @@ import argparse
 from PIL import Image, ImageOps, ImageFilter
 from moviepy import *
 from vima5.canva import *
-from rembg import remove as rembg
+from vima5.bgremoval import remove_backgrounds
 import random
 from typing import List, Tuple, Optional
 from elevenlabs.types import VoiceSettings
 
-from vima5.utils import mask_alpha
+from vima5.utils import mask_alpha_many
 from vima5.utils import make_voiceover, get_asset_path
 from types import SimpleNamespace
 
@@ -360,6 +360,8 @@ def generate_config(args, config):
         Image.open(args.input_dir + '/' + f) for f in images
     ], [CANVA_WIDTH, CANVA_HEIGHT])
     print(placements)
+    rembgs = []
+    masks = []
     for i, animal in enumerate(data['animals']):
         x, y, scale = placements[i]
         animal['scale'] = scale
@@ -371,15 +373,16 @@ def generate_config(args, config):
         black_path = args.input_dir + '/build/' + animal['file'].replace('.png', '_black.png')
 
         if not os.path.exists(rembg_path):
-            rembg_image = rembg(image, model='isnet-anime')
-            rembg_image.save(rembg_path)
-
+            rembgs.append((args.input_dir + '/' + animal['file'], rembg_path))
         if not os.path.exists(black_path):
-            mask_alpha(rembg_path, black_path,
-                translucency_mask_color=(0, 0, 0),
-                transparent_mask_color=(0, 0, 0, 0),
-                opacity_mask_color=(0, 0, 0),
-            )
+            masks.append((rembg_path, black_path))
+
+    remove_backgrounds(rembgs, model='isnet-anime')
+    mask_alpha_many(masks,
+        translucency_mask_color=(0, 0, 0),
+        transparent_mask_color=(0, 0, 0, 0),
+        opacity_mask_color=(0, 0, 0),
+    )
 
 
     with open(config, 'w') as f:
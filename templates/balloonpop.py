@@ -46,19 +46,18 @@ def make_page(config, idx):
     with movie.page(duration=total_duration, background='#ffffff') as page:
         bg = config['clips'][idx].get('background')
         if bg:
-            bg_clip = ImageClip(config['input_dir'] + '/' + bg)
+            bg_clip = image_clip(config['input_dir'] + '/' + bg, (CANVA_WIDTH, CANVA_HEIGHT))
             page.elem(
-                (bg_clip.with_position('center')
-                .resized((CANVA_WIDTH, CANVA_HEIGHT))),
+                bg_clip.with_position('center'),
                 start=0,
                 duration=total_duration,
             )
 
-        obj_clip = ImageClip(config['input_dir'] + '/' + config['clips'][idx]['object'])
+        obj_clip = image_clip(
+            config['input_dir'] + '/' + config['clips'][idx]['object'],
+            config['clips'][idx].get('object_scale'),
+        )
         w, h = obj_clip.w, obj_clip.h
-        if 'object_scale' in config['clips'][idx]:
-            obj_clip = obj_clip.resized(config['clips'][idx]['object_scale'])
-            w, h = obj_clip.w, obj_clip.h
         page.elem(
             obj_clip
             .with_position(anchor_center(0, 0, CANVA_WIDTH, CANVA_HEIGHT, w, h))
@@ -67,46 +66,54 @@ def make_page(config, idx):
             ])
         )
     
-        confetti = VideoFileClip(
+        confetti_w, confetti_h = (int(side * 0.5) for side in asset_size(get_asset_path(congrats_asset)))
+        congrats_scale = config.get('congrats_scale') or 0.5
+        scaled_confetti = video_clip(
             get_asset_path(congrats_asset),
+            (int(confetti_w * congrats_scale), int(confetti_h * congrats_scale)),
             has_mask=True,
-        ).resized(0.5)
+        )
     
         for i in range(balloons_count):
             balloon_asset = balloons_assets[i % len(balloons_assets)]
-            angle = np.random.uniform(0, 5.0)
+            # Half-degree steps, so balloons of an asset share baked swings.
+            angle = round(np.random.uniform(0, 5.0) * 2) / 2
             scale = 30
             margin = 100
             balloon_duration = started_popping_at + pop_duration/balloons_count * (balloons_count-i)
     
+            balloon_scale = config.get('balloons_scale') or 0.8
             if balloon_asset.endswith('.png'):
-                balloon = ImageClip(get_asset_path(balloon_asset))
+                balloon = image_clip(get_asset_path(balloon_asset), balloon_scale)
             else:
                 balloon = (
-                    VideoFileClip(get_asset_path(balloon_asset), has_mask=True)
+                    video_clip(get_asset_path(balloon_asset), balloon_scale, has_mask=True)
                     .with_effects([
                         vfx.Loop(duration=balloon_duration),
                     ])
                 )
     
-            balloon = balloon.resized(config.get('balloons_scale') or 0.8)
-    
             balloon_pos = (
                 np.random.randint(margin, CANVA_WIDTH-margin-balloon.w),
                 np.random.randint(margin, CANVA_HEIGHT-margin-balloon.h),
             )
     
     
+            swinging = balloon.with_effects([
+                Swing(
+                    -1.0*angle,
+                    angle,
+                    1
+                )
+            ])
+            if balloon_asset.endswith('.png'):
+                swinging = bake(swinging, period=1, fps=FPS, phase=np.random.uniform(0, 1))
+    
             page.elem(
-                balloon
+                swinging
                 .with_position(balloon_pos)
                 .with_effects([
                     FloatAnimation(scale=scale),
-                    Swing(
-                        -1.0*angle,
-                        angle,
-                        1
-                    )
                 ]),
                 start=0,
                 duration=balloon_duration,
@@ -115,7 +122,7 @@ def make_page(config, idx):
             confetti_pos = anchor_center(
                     balloon_pos[0], balloon_pos[1],
                     balloon.w, balloon.h,
-                    confetti.w, confetti.h,
+                    confetti_w, confetti_h,
             )
             confetti_pos = (
                 max(0, confetti_pos[0]),
@@ -123,8 +130,7 @@ def make_page(config, idx):
             )
             confetti_start = balloon_duration
             page.elem(
-                confetti
-                .resized(config.get('congrats_scale') or 0.5)
+                scaled_confetti
                 .with_position(confetti_pos),
                 start=confetti_start,
                 duration=congrats_duration,
@@ -68,10 +68,10 @@ def make_question(config, idx):
             )
             .with_position(('center', CANVA_HEIGHT - 200))
             .with_duration(total_duration)
-            .with_effects([
+            .with_effects(fuse_effects([
                 vfx.CrossFadeIn(0.5),
                 vfx.CrossFadeOut(0.5),
-            ]),
+            ])),
             start=0,
             duration=total_duration,
         )
@@ -175,10 +175,10 @@ def make_answer(config, idx):
             )
             .with_position(('center', CANVA_HEIGHT - 200))
             .with_duration(total_duration)
-            .with_effects([
+            .with_effects(fuse_effects([
                 vfx.CrossFadeIn(0.5),
                 vfx.CrossFadeOut(0.5),
-            ]),
+            ])),
             start=0,
             duration=total_duration,
         )
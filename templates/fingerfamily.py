@@ -201,10 +201,10 @@ def make_finger_page(context, duration, obj, hand, finger, background, prev_back
                 page.elem(
                     ImageClip(audience)
                     .with_position(pos)
-                    .with_effects([
+                    .with_effects(fuse_effects([
                         vfx.Resize((960, 540)),
                         SquishBounceEffect(),
-                    ])
+                    ]))
                 )
     
     
@@ -367,6 +367,7 @@ def make_all_fingers_page(context, duration, objects, hand, background, prev_bac
         hand_center = HAND_CENTERS[os.path.basename(hand)]
         hand_img = Image.open(hand)
         
+        stamps = []
         for finger, obj in enumerate(objects):
             hand_anchor = HAND_ANCHORS[os.path.basename(hand)][finger]
             objimg = Image.open(obj)
@@ -375,7 +376,8 @@ def make_all_fingers_page(context, duration, objects, hand, background, prev_bac
                 int(hand_anchor[0] - objimg.size[0]/2),
                 int(hand_anchor[1] - objimg.size[1]/2),
             )
-            paste_non_transparent(objimg, hand_img, point)
+            stamps.append((objimg, point))
+        stamp_many(hand_img, stamps, blend=False)
         
         hand_clip = ImageClip(np.array(hand_img))
         hand_clip = hand_clip.with_position(HAND_POS[os.path.basename(hand)])
@@ -25,7 +25,7 @@ import json
 import argparse
 from moviepy import *
 from vima5.canva import *
-from vima5.utils import make_voiceover, get_asset_path
+from vima5.utils import make_voiceover, make_voiceovers, get_asset_path
 from types import SimpleNamespace
 
 DEFAULT_VALUES = {
@@ -69,6 +69,16 @@ def parse_args():
     args = parser.parse_args()
     return args
 
+def auto_voiceovers(pages):
+    """The (text, voice) lines that pages with 'auto:' voiceovers will need."""
+    lines = []
+    for page in pages:
+        if page.text_voiceover_mp3.startswith('auto:'):
+            lines.append((page.text, page.text_voiceover_mp3.split(':')[1]))
+        if page.highlight_voiceover_mp3.startswith('auto:'):
+            lines.append((page.highlight, page.highlight_voiceover_mp3.split(':')[1]))
+    return lines
+
 def make_page(args):
     text_voiceover_mp3 = args.text_voiceover_mp3
     if text_voiceover_mp3.startswith('auto:'):
@@ -274,8 +284,12 @@ if __name__ == '__main__':
             _config.update(config)
             make_page(SimpleNamespace(**_config))
         elif isinstance(config, list):
+            pages = []
             for c in config:
                 _config = dict(DEFAULT_VALUES)
                 _config.update(c)
-                make_page(SimpleNamespace(**_config))
+                pages.append(SimpleNamespace(**_config))
+            make_voiceovers(auto_voiceovers(pages))
+            for page in pages:
+                make_page(page)
     render_pages(args.output, fps=30)
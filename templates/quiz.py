@@ -24,6 +24,8 @@ import numpy as np
 from PIL import Image, ImageDraw, ImageFilter
 from elevenlabs.client import ElevenLabs
 from elevenlabs import save as save_voiceover
+from vima5.canva import Resize
+from vima5.utils import get_asset_path
 
 logger = logging.getLogger(__name__)
 
@@ -67,16 +69,6 @@ CONGRATS = [
     "Wow, you're on a winning run!",
 ]
 
-def get_asset_path(path):
-    if not os.environ.get('ASSET_PATH'):
-        raise Exception('ASSET_PATH not set')
-    search_paths = os.environ['ASSET_PATH'].split(',')
-    for search_path in search_paths:
-        print(search_path)
-        if Path(search_path).joinpath(path).exists():
-            return Path(search_path).joinpath(path)
-    raise Exception(f'Asset not found: {path}')
-
 def get_build_path(path):
     if os.environ.get('BUILD_PATH'):
         return Path(os.environ['BUILD_PATH']) / path
@@ -308,7 +300,7 @@ def make_level(data):
     image = Image.open(image_path)
     rounded_image = round_corners(image, radius=50)
     image_clip = ImageClip(np.array(rounded_image)).with_duration(world_duration).with_start(intro_duration)
-    image_clip = image_clip.with_effects([vfx.Resize(lambda t: (710 - 10 * math.sin(t), 710 - 10 * math.sin(t)))])
+    image_clip = image_clip.with_effects([Resize(lambda t: (710 - 10 * math.sin(t), 710 - 10 * math.sin(t)))])
     image_clip_margin_bottom = 100
     image_clip_margin_left = 100
     image_clip = image_clip.with_position(lambda t: (
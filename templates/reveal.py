@@ -8,9 +8,9 @@ import random
 from dataclasses import dataclass, field
 from typing import List, Dict
 import numpy as np
-from rembg import remove as rembg
 from PIL import Image, ImageFilter, ImageDraw
 from vima5.utils import get_asset_path, get_build_path, save_mp4, blacken_image, mask_alpha
+from vima5.bgremoval import remove_background
 from vima5.particles.particle_effect import ParticleEffect
 from vima5.particles.renderers.image_effect_renderer import ImageEffectRenderer
 from moviepy import *
@@ -173,7 +173,7 @@ def make_rembg(args):
     black_path = get_build_path(os.path.splitext(os.path.basename(args.image))[0] + "_black.png")
     rembg_path = get_build_path(os.path.splitext(os.path.basename(args.image))[0] + "_rembg.png")
     image = Image.open(image_path).convert("RGBA")
-    rembg_image = rembg(image)
+    rembg_image = remove_background(image)
     rembg_image.save(rembg_path)
     mask_alpha(rembg_path, black_path,
         translucency_mask_color=(0, 0, 0),
@@ -190,7 +190,7 @@ def make_video(args):
     image = Image.open(image_path).convert("RGBA")
 
     if not os.path.exists(rembg_path):
-        rembg_image = rembg(image)
+        rembg_image = remove_background(image)
         rembg_image.save(rembg_path)
 
     if not os.path.exists(black_path):
@@ -0,0 +1,135 @@
+import numpy as np
+from moviepy import ColorClip, CompositeVideoClip, ImageClip, VideoClip, vfx
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from PIL import Image
+
+from vima5.canva import Blur, Flip, FloatAnimation, Movie, RemoveColor, Resize, SquishBounceEffect, Spring, Swing, _fingerprint, bake, fuse_effects, image_clip
+
+
+def test_render_frame_segments_with_workers(tmp_path):
+    movie = Movie()
+    with movie.page(duration=0.5) as page:
+        page.elem(ColorClip((64, 64), color=(255, 0, 0)).with_position((10, 10)))
+
+    output = tmp_path / 'out.mp4'
+    movie.render(str(output), fps=12, resolution='480p', workers=2, segment='frame')
+
+    infos = ffmpeg_parse_infos(str(output))
+    assert infos['duration'] == 0.5
+
+
+def _gradient():
+    y, x = np.mgrid[0:40, 0:60]
+    return np.dstack([x * 4, y * 6, np.full_like(x, 128)]).astype(np.uint8)
+
+
+def test_fused_sprites_differ_by_flip_axis():
+    image = _gradient()
+    frames = {
+        axis: ImageClip(image).with_duration(2).with_effects(fuse_effects([
+            Flip(duration=2, rotation_axis=axis), vfx.CrossFadeIn(0.5),
+        ])).get_frame(0.3)
+        for axis in ('vertical', 'horizontal')
+    }
+    assert not np.array_equal(frames['vertical'], frames['horizontal'])
+
+
+def test_fused_sprites_differ_by_swing_expand():
+    image = _gradient()
+    frames = {
+        expand: ImageClip(image).with_duration(2).with_effects(fuse_effects([
+            Swing(30, 30, 1, expand=expand), vfx.CrossFadeIn(0.5),
+        ])).get_frame(0.3)
+        for expand in (True, False)
+    }
+    assert frames[False].shape == image.shape
+    assert frames[True].shape != image.shape
+
+
+def test_bake_shares_sheets_across_placements_only():
+    image = _gradient()
+
+    def flipping(duration, position=(0, 0), start=0):
+        return (
+            ImageClip(image).with_duration(8)
+            .with_effects([Flip(duration=duration)])
+            .with_position(position).with_start(start)
+        )
+
+    short, placed, long = flipping(1), flipping(1, (100, 50), 3), flipping(4)
+    assert np.array_equal(bake(short, 1).get_frame(0.2), bake(placed, 1).get_frame(0.2))
+    assert not np.array_equal(bake(short, 1).get_frame(0.2), bake(long, 1).get_frame(0.2))
+
+
+def test_fingerprint_is_stable_across_rendering():
+    image = _gradient()
+    moving = VideoClip(lambda t: np.roll(image, int(t * 10), axis=1), duration=2)
+    clips = [
+        moving.with_effects([Flip(duration=1)]),
+        moving.with_mask().with_effects([Blur(lambda t: 1 + t)]),
+        moving.with_effects([RemoveColor((0, 255, 0), tolerance=10)]),
+        moving.with_effects(fuse_effects([Swing(-10, 10, 1), vfx.CrossFadeIn(0.5)])),
+    ]
+    for clip in clips:
+        before = _fingerprint(clip)
+        clip.get_frame(0.3)
+        clip.mask.get_frame(0.3)
+        assert _fingerprint(clip) == before
+
+
+def test_float_animation_keeps_named_positions():
+    clip = (
+        ColorClip((20, 20), color=(255, 0, 0)).with_duration(1)
+        .with_position(('center', 100)).with_effects([FloatAnimation('y')])
+    )
+    x, y = clip.pos(0.5)
+    assert x == 'center'
+    assert np.isclose(y, 100 - 10 * np.sin(1.5))
+    frame = CompositeVideoClip([ColorClip((200, 200), color=(0, 0, 0)).with_duration(1), clip]).get_frame(0)
+    assert frame[110, 100].tolist() == [255, 0, 0]
+
+
+def test_spring_samples_at_the_given_times():
+    clip = ColorClip((10, 10), color=(0, 0, 0)).with_duration(3).with_effects([
+        Spring((0, 0), (150, 80), stiffness=(20, 0), damping=(1, 2), initial_velocity=(0, 30)),
+    ])
+    times = np.array([1.0, 1.5, 1.9])
+    sampled = clip.pos.sample(times)[:, :2]
+    assert np.allclose(sampled, [clip.pos(t) for t in times])
+    # A spring without stiffness coasts to a stop: 30 / 2 * (1 - e^-2t).
+    assert np.allclose(sampled[:, 1], 15 * -np.expm1(-2 * times))
+
+
+def test_remove_color_keys_float_frames():
+    image = _gradient().astype(float)
+    image[:10, :10] = (0, 255, 0)
+    clip = VideoClip(lambda t: image, duration=1).with_effects([RemoveColor((0, 255, 0))])
+    assert clip.get_frame(0).shape == image.shape
+    assert clip.mask.get_frame(0)[5, 5] == 0
+    assert clip.mask.get_frame(0)[20, 20] == 1
+
+
+def test_preview_builds_assets_at_proxy_size(tmp_path):
+    path = tmp_path / 'gradient.png'
+    Image.fromarray(_gradient()).save(path)
+    clip = image_clip(path, (120, 80), preview_scale=0.5)
+    assert clip.size == (60, 40)
+    assert clip.with_effects([Resize((60, 20))]).size == (30, 10)
+    assert clip.with_effects([SquishBounceEffect()]).get_frame(0).shape == (45, 60, 3)
+
+    movie = Movie()
+    with movie.page(duration=1, background='#000000') as page:
+        page.elem(clip.with_position((100, 50)))
+    final, _ = movie.compose(resolution='480p', preview_scale=0.5)
+    assert final.size == (320, 240)
+    # Only the position is scaled; the frame is composited as decoded.
+    assert np.array_equal(final.get_frame(0)[25:65, 50:110], clip.get_frame(0))
+
+
+def test_flattened_transparent_page_keeps_the_canvas_size():
+    movie = Movie()
+    with movie.page(duration=1) as page:
+        page.elem(ColorClip((64, 64), color=(255, 0, 0)).with_position((10, 10)))
+    final, _ = movie.compose(resolution='480p')
+    assert final.size == (640, 480)
+    assert final.get_frame(0)[20, 20].tolist() == [255, 0, 0]
@@ -0,0 +1,76 @@
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from moviepy.config import FFMPEG_BINARY
+
+from vima5 import utils
+
+
+class FakeElevenLabs:
+    """Stands in for the ElevenLabs client, recording what it's asked for."""
+    calls = []
+    lock = threading.Lock()
+
+    def generate(self, text, voice, model):
+        with self.lock:
+            self.calls.append(text)
+        # Slow enough that concurrent requests overlap.
+        time.sleep(0.3)
+        return text
+
+
+def fake_save(audio, filename):
+    # A tone as long as the text is, so each line's file can be told apart.
+    subprocess.run(
+        [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=d={len(audio) / 10}', filename],
+        check=True,
+    )
+
+
+@pytest.fixture
+def tts(tmp_path, monkeypatch):
+    FakeElevenLabs.calls = []
+    monkeypatch.setattr(utils, 'ElevenLabs', FakeElevenLabs)
+    monkeypatch.setattr(utils, 'save_voiceover', fake_save)
+    monkeypatch.setattr(utils, 'cache', {})
+    monkeypatch.setattr(utils, 'VOICEOVER_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(utils, 'voiceover_cache', utils.AudioCache(str(tmp_path), 1 << 30))
+    # Lines unique to this run, so no earlier voiceover is reused.
+    return lambda text: f'{text} {tmp_path.name}'
+
+
+def test_make_voiceovers_dedupes_and_keeps_order(tts):
+    one, two = tts('one'), tts('a second line')
+    files = utils.make_voiceovers([(one, 'Arthur'), (two, 'Arthur'), (one, 'Arthur')])
+
+    assert sorted(FakeElevenLabs.calls) == sorted([one, two])
+    assert files[0] == files[2] != files[1]
+    assert utils.voiceover_duration(files[0]) == pytest.approx(len(one) / 10, abs=0.1)
+    assert utils.voiceover_duration(files[1]) == pytest.approx(len(two) / 10, abs=0.1)
+
+
+def test_concurrent_requests_share_one_call(tts):
+    line = tts('said at once')
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        files = list(pool.map(lambda _: utils.make_voiceover(line), range(4)))
+
+    assert FakeElevenLabs.calls == [line]
+    assert len(set(files)) == 1
+
+
+def test_asset_index_rescans_removed_assets(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir(), second.mkdir()
+    (first / 'ball.png').touch()
+    index = utils.AssetIndex([first, second])
+    assert index.resolve('ball.png') == first / 'ball.png'
+
+    (first / 'ball.png').rename(second / 'ball.png')
+    assert index.resolve('ball.png') == second / 'ball.png'
+
+    (second / 'ball.png').unlink()
+    with pytest.raises(Exception, match='Asset not found'):
+        index.resolve('ball.png')
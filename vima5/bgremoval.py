@@ -0,0 +1,85 @@
+"""
+Background removal with rembg.
+
+Each process loads one onnxruntime session per model, on first use, and
+shares it between threads. Results are cached under the build path by the
+hash of their input image, so re-running over a sticker pack only runs
+the model on new or changed images.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from vima5.utils import get_build_path
+
+# The rembg model used unless one is given.
+REMBG_MODEL = 'u2net'
+
+# Threads onnxruntime uses within an operator. 0 leaves it to onnxruntime,
+# which uses every core.
+REMBG_THREADS = int(os.environ.get('REMBG_THREADS', 0))
+
+# Sessions loaded in this process, by model and threads.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def rembg_session(model=REMBG_MODEL, threads=REMBG_THREADS):
+    """The process's rembg session for `model`, loaded on first use."""
+    with _sessions_lock:
+        if (model, threads) not in _sessions:
+            # Imported lazily: rembg pulls in pymatting, whose numba threads
+            # deadlock any process that later forks render workers.
+            import onnxruntime as ort
+            from rembg.sessions import sessions_class
+
+            session_class = next((cls for cls in sessions_class if cls.name() == model), None)
+            if session_class is None:
+                raise ValueError(f'Unknown rembg model: {model}')
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            _sessions[model, threads] = session_class(model, options)
+        return _sessions[model, threads]
+
+def remove_background(image, model=REMBG_MODEL, threads=REMBG_THREADS):
+    """`rembg.remove` of a PIL image, with the process's session."""
+    from rembg import remove
+    return remove(image, session=rembg_session(model, threads))
+
+def remove_backgrounds(jobs, model=REMBG_MODEL, workers=2, threads=REMBG_THREADS):
+    """Remove the background of many (input_image_path, output_path) pairs.
+
+    Images seen before, under any name, are served from the cache. The
+    rest run in up to `workers` threads sharing one session, so decoding
+    and encoding overlap inference. Returns the output paths."""
+    jobs = list(jobs)
+    cache_dir = get_build_path('rembg')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def remove_one(job):
+        src, dst = job
+        with open(src, 'rb') as f:
+            cached = cache_dir / f'{model}-{hashlib.sha256(f.read()).hexdigest()}.png'
+        if not cached.exists():
+            image = Image.open(src).convert('RGBA')
+            partial = cached.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.png')
+            remove_background(image, model, threads).save(partial)
+            os.replace(partial, cached)
+        _place(cached, dst)
+        return dst
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        return list(pool.map(remove_one, jobs))
+
+def _place(path, dst):
+    """Hard-link `path` at `dst`, or copy it across devices."""
+    partial = f'{dst}.{os.getpid()}.{threading.get_ident()}'
+    try:
+        os.link(path, partial)
+    except OSError:
+        shutil.copyfile(path, partial)
+    os.replace(partial, dst)
@@ -1,17 +1,35 @@
 # Let user split video by pages.
 # Adjust start/end time of each clip to be relative to the page.
 
+import copy
+import gc
+import os
 import math
+import numbers
+import time
+import types
+import shutil
+import hashlib
+import functools
+import tempfile
+import itertools
+import multiprocessing
+from bisect import bisect_left, bisect_right
 import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from contextlib import contextmanager
-from PIL import Image, ImageColor, ImageFilter
-from typing import Dict, List, Optional, Union, Tuple
+from PIL import Image, ImageColor
+from typing import Callable, Dict, List, Optional, Union, Tuple
 from dataclasses import dataclass, field
-from skimage.transform import resize
+from scipy import ndimage
 from moviepy import *
 from moviepy.Effect import Effect
 from moviepy.Clip import Clip
-from vima5.utils import save_mp4, RESOLUTION_MAP
+from moviepy.tools import compute_position
+from moviepy.audio.io.readers import FFMPEG_AudioReader
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader, ffmpeg_parse_infos
+from vima5.utils import save_mp4, save_mp4_pipelined, save_mp4_frames, save_mp4_from_frames, encoder_frame, save_m4a, concat_mp4, get_build_path, RESOLUTION_MAP
 
 @dataclass
 class Element:
@@ -28,6 +46,11 @@ class Element:
     flip_vertical: bool = False
     page: Optional['Page'] = None
 
+    def bake(self, period, fps=None, phase=0.0):
+        """Play the element's clip from a baked sprite sheet, see `bake`."""
+        self.clip = bake(self.clip, period, fps or BAKE_FPS, phase)
+        return self
+
 @dataclass
 class Page:
     movie: 'Movie' = None
@@ -47,11 +70,21 @@ class Page:
         if duration != 0:
             kwargs['end'] = kwargs['start'] + duration
     
+        if isinstance(clip, (str, os.PathLike)):
+            clip = asset_clip(clip)
+
         elem = Element(page=page, **kwargs)
         elem.clip = clip
         page.elements.append(elem)
         return elem
 
+@dataclass
+class PageRenderStatus:
+    num: int
+    output: str
+    seconds: float = 0.0
+    error: str = ''
+
 @dataclass
 class Movie:
     title: str = ''
@@ -76,32 +109,114 @@ class Movie:
             return None
         return self.pages[-1]
 
-    def render(self, output='output.mp4', aspect_ratio='16:9', fps=30, resolution='1080p', filter='', extra_vclips=None, extra_aclips=None, upscaler=1):
-        size = RESOLUTION_MAP.get(resolution, RESOLUTION_MAP['1080p']).get(aspect_ratio, RESOLUTION_MAP['1080p']['16:9'])
-    
-        clips = []
-    
+    def render(self, output='output.mp4', aspect_ratio='16:9', fps=30, resolution='1080p', filter='', extra_vclips=None, extra_aclips=None, upscaler=1, workers=1, segment='page', flatten=True, preview=False, scale=0.25, cache=False, pipelined=False):
+        """Render the movie to a single mp4.
+
+        With `workers` > 1 the timeline is split into segments, at page
+        boundaries (`segment='page'`) or every `segment` seconds, which are
+        encoded in parallel and joined by stream copy. With
+        `segment='frame'`, frames are instead composited in parallel and
+        fed in order to a single encoder.
+
+        With `flatten`, adjacent static layers of a page are pre-composited
+        into one plate, see `_flatten_static_layers`.
+
+        With `preview`, the movie is rendered at `scale` times its size,
+        for a quick proxy of the final layout and timing, e.g.
+        `render(preview=True, scale=0.25, fps=12)`. Positions are scaled
+        when compositing. Clips built with `image_clip` and `video_clip`
+        under PREVIEW_SCALE are decoded at proxy size, and their effects
+        run on proxy-sized frames; other clips are scaled frame by frame.
+        Without `preview`, a PREVIEW_SCALE other than 1 renders a preview
+        at that scale.
+
+        With `cache`, the output is kept in the render cache, keyed by the
+        fingerprints of the rendered pages and the render settings, and
+        reused until one of them changes. With `workers` > 1 and page
+        segments, so are the segments of unchanged pages.
+
+        With `pipelined`, a single-process render composites frames on a
+        separate thread while ffmpeg encodes, see `save_mp4_pipelined`.
+        """
+        preview_scale = scale if preview else PREVIEW_SCALE
+        fingerprints, cached = None, None
+        # Extra clips span pages, so they are not part of any page fingerprint.
+        if cache and not extra_vclips and not extra_aclips:
+            settings = (aspect_ratio, fps, resolution, upscaler, flatten, preview_scale)
+            fingerprints = [page_fingerprint(page, settings) for page in self._filter_pages(filter)]
+            if None in fingerprints:
+                fingerprints = None
+            else:
+                cached = _render_cache_path(_fingerprint('mp4', fingerprints))
+                if cached.exists():
+                    print(f'Reusing cached render {cached} for {output}')
+                    shutil.copyfile(cached, output)
+                    return
+
+        final, page_starts = self.compose(aspect_ratio=aspect_ratio, resolution=resolution, filter=filter, extra_vclips=extra_vclips, extra_aclips=extra_aclips, upscaler=upscaler, flatten=flatten, preview_scale=preview_scale)
+
+        if workers <= 1 and pipelined:
+            save_mp4_pipelined(final, output, fps=fps)
+        elif workers <= 1:
+            save_mp4(final, output, fps=fps)
+        elif segment == 'frame':
+            _render_frames(final, output, fps, workers)
+        else:
+            segment_keys = {}
+            if segment == 'page':
+                boundaries = page_starts
+                if fingerprints:
+                    # A page's frames depend on where its first frame falls.
+                    for fingerprint, page_start in zip(fingerprints, page_starts):
+                        start_frame = int(round(page_start * fps))
+                        phase = round(start_frame / fps - page_start, 9)
+                        segment_keys[start_frame] = _fingerprint('segment', fingerprint, phase)
+            else:
+                boundaries = np.arange(0, final.duration, segment)
+            _render_segments(final, output, fps, boundaries, workers, segment_keys)
+
+        if cached:
+            _store_in_render_cache(output, cached)
+
+    def _filter_pages(self, filter):
         filter = [int(f) for f in filter.split(',') if f]
-    
+        return [page for page in self.pages if not filter or page.num in filter]
+
+    def compose(self, aspect_ratio='16:9', resolution='1080p', filter='', extra_vclips=None, extra_aclips=None, upscaler=1, flatten=True, preview_scale=1):
+        """Build the final clip, and the start time of each rendered page."""
+        size = RESOLUTION_MAP.get(resolution, RESOLUTION_MAP['1080p']).get(aspect_ratio, RESOLUTION_MAP['1080p']['16:9'])
+        if preview_scale != 1:
+            # Keep both sides even, as libx264 requires for yuv420p.
+            size = tuple(2 * max(1, round(side * preview_scale / 2)) for side in size)
+
         # Set start/end for each clip
         page_start_time = 0.0
+        page_starts = []
         video_clips, audio_clips = [], []
-        for page in self.pages:
-            if filter and page.num not in filter:
-                continue
-            video_clips.append(_get_page_background_clip(page, page_start_time, size))
+        for page in self._filter_pages(filter):
+            page_starts.append(page_start_time)
+            page_clips = [_get_page_background_clip(page, page_start_time, size)]
             for elem in page.elements:
                 clip = elem.clip
                 clip = clip.with_start(page_start_time + elem.start)
                 clip = clip.with_end(page_start_time + (elem.end if elem.end else page.duration))
                 if isinstance(clip, (AudioFileClip, CompositeAudioClip)):
                     audio_clips.append(clip)
+                elif preview_scale != 1:
+                    page_clips.append(_proxy_clip(clip, preview_scale))
                 else:
-                    video_clips.append(clip)
-                
+                    page_clips.append(clip)
+
+            if flatten:
+                page_clips = _flatten_static_layers(page_clips, size)
+            video_clips.extend(page_clips)
             page_start_time += page.duration
     
-        final = CompositeVideoClip(video_clips + (extra_vclips if extra_vclips else []))
+        extra_vclips = extra_vclips if extra_vclips else []
+        if preview_scale != 1:
+            extra_vclips = [_proxy_clip(clip, preview_scale) for clip in extra_vclips]
+        # Sized explicitly: a flattened plate is cropped, and may come first.
+        final = TimelineCompositeVideoClip(video_clips + extra_vclips, size=size)
 
         if upscaler != 1:
             final = final.resized(upscaler)
@@ -109,16 +224,652 @@ class Movie:
         if audio_clips:
             audio_clips = audio_clips + (extra_aclips if extra_aclips else [])
             final = final.with_audio(CompositeAudioClip(audio_clips))
-    
-        save_mp4(final, output, fps=fps)
 
-    def render_each_page(self, output, *args, **kwargs):
-        for page_num in range(1, len(self.pages) + 1):
-            out = output.replace('.mp4', f'-{page_num}.mp4')
-            self.render(filter=str(page_num), output=out, *args, **kwargs)
+        return final, page_starts
+
+    def render_each_page(self, output, *args, workers=1, **kwargs):
+        jobs = [
+            (page_num, output.replace('.mp4', f'-{page_num}.mp4'))
+            for page_num in range(1, len(self.pages) + 1)
+        ]
+
+        if workers <= 1:
+            statuses = []
+            for page_num, out in jobs:
+                started_at = time.perf_counter()
+                self.render(filter=str(page_num), output=out, *args, **kwargs)
+                statuses.append(PageRenderStatus(page_num, out, time.perf_counter() - started_at))
+            return statuses
+
+        # Workers are forked so they inherit the clip graph (lambdas and all)
+        # instead of pickling it.
+        global _forked_movie
+        _forked_movie = self
+        statuses = []
+        try:
+            with _fork_pool(workers) as pool:
+                futures = [
+                    pool.submit(_render_page_job, page_num, out, args, kwargs)
+                    for page_num, out in jobs
+                ]
+                for future in as_completed(futures):
+                    status = future.result()
+                    if status.error:
+                        print(f'Page {status.num}: failed after {status.seconds:.1f}s: {status.error}')
+                    else:
+                        print(f'Page {status.num}: rendered {status.output} in {status.seconds:.1f}s')
+                    statuses.append(status)
+        finally:
+            _forked_movie = None
+
+        statuses.sort(key=lambda status: status.num)
+        failed = [status for status in statuses if status.error]
+        if failed:
+            raise RuntimeError(f'Failed to render pages: {", ".join(str(status.num) for status in failed)}')
+        return statuses
 
 movie = Movie('Untitled Movie')
 
+class TimelineCompositeVideoClip(CompositeVideoClip):
+    """A CompositeVideoClip that only visits the clips playing at `t`.
+
+    The start and end times of all clips cut the timeline into spans during
+    which the same clips are playing. The spans are indexed once, so each
+    frame costs a bisect plus the playing clips, not a scan of every clip
+    in the movie.
+
+    Layers are blended in place into premultiplied float32 color and alpha
+    buffers that are allocated once, touching only each layer's bounding
+    box, instead of through a full-frame Pillow canvas per layer. The
+    alpha of the last frame is kept so the mask does not composite the
+    same layers again.
+    """
+
+    def __init__(self, clips, *args, **kwargs):
+        super().__init__(clips, *args, **kwargs)
+        self._index_timeline()
+        # Shared with copies of this clip (moviepy copies on every with_*)
+        # and with its mask.
+        self._buffers = _Memo()
+        if isinstance(self.mask, CompositeVideoClip):
+            self.mask = TimelineCompositeVideoClip(self.mask.clips, self.size, is_mask=True, bg_color=0.0)
+            self.mask._buffers = self._buffers
+
+    def _index_timeline(self):
+        bounds = sorted(
+            {clip.start for clip in self.clips}
+            | {clip.end for clip in self.clips if clip.end is not None}
+        )
+        # self.clips is sorted by layer, so every span keeps the layer order.
+        playing = [[] for _ in bounds]
+        for clip in self.clips:
+            first = bisect_left(bounds, clip.start)
+            last = len(bounds) if clip.end is None else bisect_left(bounds, clip.end)
+            for span in range(first, last):
+                playing[span].append(clip)
+        self._bounds = bounds
+        self._playing = playing
+
+    def playing_clips(self, t=0):
+        span = bisect_right(self._bounds, t) - 1
+        if span < 0:
+            return []
+        return self._playing[span]
+
+    def frame_function(self, t):
+        buffers = self._buffers
+        if self.is_mask:
+            if buffers.get('t') == t:
+                return buffers['alpha'].copy()
+            return super().frame_function(t)
+        if not self.created_bg:
+            return super().frame_function(t)
+
+        if 'color' not in buffers:
+            w, h = self.size
+            buffers['color'] = np.empty((h, w, 3), np.float32)
+            buffers['alpha'] = np.empty((h, w), np.float32)
+            buffers['scratch'] = np.empty((h, w, 3), np.float32)
+            buffers['scratch_alpha'] = np.empty((h, w), np.float32)
+        color, alpha = buffers['color'], buffers['alpha']
+        buffers['t'] = None
+
+        bg_color = np.asarray(self.bg_color, dtype=np.float32)
+        bg_alpha = bg_color[3] / 255 if len(bg_color) == 4 else 1
+        color[...] = bg_color[:3] * bg_alpha
+        alpha[...] = bg_alpha
+        for clip in self.playing_clips(t):
+            self._blend(clip, t)
+
+        # Unpremultiply. Transparent pixels hold no color, so they stay 0.
+        rgb = buffers['scratch']
+        np.maximum(alpha, np.float32(1e-6), out=buffers['scratch_alpha'])
+        np.divide(color, buffers['scratch_alpha'][..., None], out=rgb)
+        np.rint(rgb, out=rgb)
+        buffers['t'] = t
+        return rgb.astype(np.uint8)
+
+    def _blend(self, clip, t):
+        """Blend a clip over the frame buffers, within its bounding box."""
+        ct = t - clip.start
+        frame = clip.get_frame(ct).astype(np.uint8, copy=False)
+        if clip.mask is not None:
+            mask = _fit_mask(clip.mask.get_frame(ct), frame.shape[:2])
+        elif frame.shape[2] == 4:
+            mask = frame[..., 3] / np.float32(255)
+        else:
+            mask = None
+
+        h, w = frame.shape[:2]
+        x, y = compute_position((w, h), self.size, clip.pos(ct), clip.relative_pos)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.size[0]), min(y + h, self.size[1])
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        buffers = self._buffers
+        src = frame[y0 - y:y1 - y, x0 - x:x1 - x, :3]
+        color = buffers['color'][y0:y1, x0:x1]
+        alpha = buffers['alpha'][y0:y1, x0:x1]
+        if mask is None:
+            color[...] = src
+            alpha[...] = 1
+            return
+
+        # color += (src - color) * a; alpha += (1 - alpha) * a
+        a = mask[y0 - y:y1 - y, x0 - x:x1 - x]
+        scratch = buffers['scratch'][:y1 - y0, :x1 - x0]
+        np.subtract(src, color, out=scratch)
+        scratch *= a[..., None]
+        color += scratch
+        scratch_alpha = buffers['scratch_alpha'][:y1 - y0, :x1 - x0]
+        np.subtract(1, alpha, out=scratch_alpha)
+        scratch_alpha *= a
+        alpha += scratch_alpha
+
+def _fit_mask(mask, shape):
+    """Crop or pad a mask to the frame it belongs to, anchored top left,
+    as moviepy does when compositing."""
+    if mask.shape == shape:
+        return mask
+    fitted = np.zeros(shape, dtype=mask.dtype)
+    h, w = min(shape[0], mask.shape[0]), min(shape[1], mask.shape[1])
+    fitted[:h, :w] = mask[:h, :w]
+    return fitted
+
+# The movie, or final clip, being rendered by forked workers, see `_fork_pool`.
+_forked_movie = None
+_forked_clip = None
+
+def _fork_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_reopen_media_readers,
+    )
+
+def _reopen_media_readers():
+    """Restart the ffmpeg readers inherited from the parent process.
+
+    A forked worker shares the parent's decoder pipes, so concurrent reads
+    would interleave. Each worker drops them and spawns its own."""
+    for obj in gc.get_objects():
+        if isinstance(obj, (FFMPEG_VideoReader, FFMPEG_AudioReader)) and obj.proc:
+            obj.proc = None
+            obj.initialize()
+
+def _render_page_job(page_num, output, args, kwargs):
+    started_at = time.perf_counter()
+    try:
+        _forked_movie.render(filter=str(page_num), output=output, *args, **kwargs)
+    except Exception as e:
+        return PageRenderStatus(page_num, output, time.perf_counter() - started_at, repr(e))
+    return PageRenderStatus(page_num, output, time.perf_counter() - started_at)
+
+def _render_segment_job(path, start_frame, end_frame, fps):
+    save_mp4_frames(_forked_clip, path, fps, start_frame, end_frame)
+    return path
+
+def _render_frame_job(start_frame, end_frame, fps):
+    has_mask = _forked_clip.mask is not None
+    return [
+        encoder_frame(_forked_clip, frame_index / fps, has_mask)
+        for frame_index in range(start_frame, end_frame)
+    ]
+
+def _render_frames(final, output, fps, workers, frames_per_job=8):
+    """Composite frames in forked workers and encode them in one pass.
+
+    Each job covers a run of consecutive frames so video sources keep
+    reading sequentially. At most two jobs per worker are in flight, which
+    bounds the frames held in memory."""
+    total_frames = int(final.duration * fps)
+    starts = iter(range(0, total_frames, frames_per_job))
+
+    def submit(pool, start_frame):
+        end_frame = min(start_frame + frames_per_job, total_frames)
+        return pool.submit(_render_frame_job, start_frame, end_frame, fps)
+
+    def frames(pool, pending):
+        while pending:
+            done = pending.popleft().result()
+            start_frame = next(starts, None)
+            if start_frame is not None:
+                pending.append(submit(pool, start_frame))
+            yield from done
+
+    global _forked_clip
+    _forked_clip = final
+    try:
+        with _fork_pool(workers) as pool:
+            # The first submit forks every worker, which must happen before
+            # the encoder opens: a worker inheriting ffmpeg's stdin keeps it
+            # open, and ffmpeg never sees EOF.
+            pending = deque(submit(pool, start_frame) for start_frame in itertools.islice(starts, 2 * workers))
+            save_mp4_from_frames(final, output, fps, frames(pool, pending))
+    finally:
+        _forked_clip = None
+
+def _render_segments(final, output, fps, boundaries, workers, segment_keys=None):
+    # Cut on whole frames so the segments hold exactly the frames a single
+    # `save_mp4` pass would write.
+    total_frames = int(final.duration * fps)
+    cuts = sorted({0, total_frames} | {
+        int(round(boundary * fps)) for boundary in boundaries
+        if 0 < round(boundary * fps) < total_frames
+    })
+
+    segment_keys = segment_keys or {}
+
+    global _forked_clip
+    _forked_clip = final
+    try:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as tmpdir:
+            paths, jobs = [], []
+            for i, (start_frame, end_frame) in enumerate(zip(cuts, cuts[1:])):
+                path, cached = os.path.join(tmpdir, f'segment-{i}.mp4'), None
+                if start_frame in segment_keys:
+                    cached = _render_cache_path(_fingerprint(segment_keys[start_frame], end_frame - start_frame))
+                    if cached.exists():
+                        paths.append(cached)
+                        continue
+                paths.append(path)
+                jobs.append((path, start_frame, end_frame, cached))
+            with _fork_pool(workers) as pool:
+                futures = [
+                    (pool.submit(_render_segment_job, path, start_frame, end_frame, fps), cached)
+                    for path, start_frame, end_frame, cached in jobs
+                ]
+                # Audio is encoded once for the whole timeline so there are
+                # no encoder priming gaps at segment boundaries.
+                audiofile = None
+                if final.audio is not None:
+                    audiofile = os.path.join(tmpdir, 'audio.m4a')
+                    save_m4a(final, audiofile)
+                for future, cached in futures:
+                    path = future.result()
+                    if cached:
+                        _store_in_render_cache(path, cached)
+            concat_mp4(paths, output, audiofile=audiofile)
+    finally:
+        _forked_clip = None
+
+# Bump to invalidate every cached render, e.g. when encoding settings change.
+_RENDER_CACHE_VERSION = 1
+
+# Clip attributes that hold per-frame memos rather than content.
+_UNFINGERPRINTED_ATTRS = {'memoized_t', 'memoized_frame', 'page', 'movie', '_table'}
+
+class _Memo(dict):
+    """Scratch state an effect keeps between frames, such as the last
+    frame it computed or reusable buffers. It changes as frames render but
+    never changes what a frame looks like, so fingerprints skip it."""
+
+class _Unfingerprintable(Exception):
+    pass
+
+def page_fingerprint(page, settings=()):
+    """A stable digest of everything that decides how a page renders.
+
+    Covers the page duration and background, every element's fields and
+    clip graph (frames, positions, effect dataclass fields and the code and
+    captured variables of lambdas) and the content of the source files.
+    Returns None when the page holds something that cannot be digested.
+    """
+    elements = [
+        ({k: v for k, v in vars(elem).items() if k != 'page'})
+        for elem in page.elements
+    ]
+    background = page.background
+    if background and os.path.isfile(background):
+        background = (background, _file_digest(background))
+    try:
+        return _fingerprint(
+            _RENDER_CACHE_VERSION, settings, page.duration, page.color,
+            background, page.animate, page.animate_config, elements,
+        )
+    except _Unfingerprintable:
+        return None
+
+def _fingerprint(*objs):
+    digest = hashlib.sha256()
+    _digest_into(digest, objs, {})
+    return digest.hexdigest()
+
+def _digest_into(digest, obj, seen):
+    def put(*parts):
+        digest.update(repr(parts).encode())
+
+    if obj is None or obj is Ellipsis or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        put(type(obj).__name__, obj)
+        return
+    if isinstance(obj, np.generic):
+        put('scalar', obj.dtype.str, obj.item())
+        return
+    if isinstance(obj, types.ModuleType):
+        put('module', obj.__name__)
+        return
+    if isinstance(obj, type):
+        put('class', obj.__module__, obj.__qualname__)
+        return
+    if isinstance(obj, (Movie, Page)):
+        # Only reachable through globals of template code; digesting the
+        # whole movie would tie every page to every other page.
+        put(type(obj).__name__)
+        return
+    if isinstance(obj, (AssetCache, _Memo)):
+        # Caches reachable through globals of effect code, and memos in
+        # their closures: they change as frames render, but never change
+        # what a frame looks like.
+        put(type(obj).__name__)
+        return
+
+    # Objects are digested once; later references, including cycles through
+    # the clip graph, refer back to the first visit. The object is kept so
+    # its id is not reused while digesting.
+    if id(obj) in seen:
+        put('ref', seen[id(obj)][0])
+        return
+    seen[id(obj)] = (len(seen), obj)
+
+    if isinstance(obj, np.ndarray):
+        put('ndarray', obj.dtype.str, obj.shape)
+        if obj.dtype == object:
+            for item in obj.flat:
+                _digest_into(digest, item, seen)
+        else:
+            digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, Image.Image):
+        put('image', obj.mode, obj.size)
+        digest.update(obj.tobytes())
+    elif isinstance(obj, (list, tuple)):
+        put(type(obj).__name__, len(obj))
+        for item in obj:
+            _digest_into(digest, item, seen)
+    elif isinstance(obj, (set, frozenset)):
+        put(type(obj).__name__, len(obj))
+        for item in sorted(obj, key=repr):
+            _digest_into(digest, item, seen)
+    elif isinstance(obj, dict):
+        put('dict', len(obj))
+        for key, value in obj.items():
+            _digest_into(digest, key, seen)
+            _digest_into(digest, value, seen)
+    elif isinstance(obj, (FFMPEG_VideoReader, FFMPEG_AudioReader)):
+        put('reader', _file_digest(obj.filename), *(
+            getattr(obj, attr, None) for attr in ('size', 'fps', 'pixel_format', 'nbytes', 'nchannels')
+        ))
+    elif isinstance(obj, types.FunctionType):
+        put('function', obj.__qualname__)
+        _digest_code(digest, obj.__code__, obj.__globals__, seen)
+        _digest_into(digest, obj.__defaults__, seen)
+        _digest_into(digest, obj.__kwdefaults__, seen)
+        for cell in obj.__closure__ or ():
+            try:
+                _digest_into(digest, cell.cell_contents, seen)
+            except ValueError:  # Empty cell
+                put('cell')
+    elif isinstance(obj, types.MethodType):
+        put('method')
+        _digest_into(digest, obj.__func__, seen)
+        _digest_into(digest, obj.__self__, seen)
+    elif isinstance(obj, functools.partial):
+        put('partial')
+        _digest_into(digest, (obj.func, obj.args, obj.keywords), seen)
+    elif isinstance(obj, (types.BuiltinFunctionType, np.ufunc)):
+        put('builtin', getattr(obj, '__module__', None), obj.__qualname__ if hasattr(obj, '__qualname__') else obj.__name__)
+        owner = getattr(obj, '__self__', None)
+        if owner is not None and not isinstance(owner, types.ModuleType):
+            _digest_into(digest, owner, seen)
+    elif hasattr(obj, '__dict__'):
+        # Clips, effects and other plain objects are digested by attributes.
+        put('object', type(obj).__module__, type(obj).__qualname__)
+        _digest_into(digest, {
+            key: value for key, value in sorted(vars(obj).items())
+            if key not in _UNFINGERPRINTED_ATTRS
+        }, seen)
+    else:
+        raise _Unfingerprintable(type(obj))
+
+def _digest_code(digest, code, globals_, seen):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _digest_code(digest, const, globals_, seen)
+        else:
+            _digest_into(digest, const, seen)
+    # Module-level values the code reads, such as template constants.
+    for name in code.co_names:
+        if name in globals_:
+            _digest_into(digest, (name, globals_[name]), seen)
+
+@functools.lru_cache(maxsize=None)
+def _file_digest_at(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _file_digest(path):
+    stat = os.stat(path)
+    return _file_digest_at(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def _render_cache_path(fingerprint):
+    return get_build_path('render-cache') / f'{fingerprint}.mp4'
+
+def _store_in_render_cache(path, cached):
+    """Copy a finished render into the cache, atomically for parallel renders."""
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    partial = cached.with_suffix(f'.{os.getpid()}.tmp')
+    shutil.copyfile(path, partial)
+    os.replace(partial, cached)
+
+# Bytes of decoded frames kept by the asset cache, per process.
+ASSET_CACHE_BYTES = 1 << 30
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+
+class AssetCache:
+    """A size-bounded LRU of decoded, resized asset frames.
+
+    Entries are keyed by path, mtime and target size, and hold read-only
+    arrays shared by every clip made from them. Forked render workers
+    inherit the cache."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, load):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        value = load()
+        nbytes = sum(array.nbytes for array in value if isinstance(array, np.ndarray))
+        for array in value:
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+asset_cache = AssetCache(ASSET_CACHE_BYTES)
+
+# Bytes of pre-transformed sprites, such as Swing rotations, per process.
+SPRITE_CACHE_BYTES = 256 << 20
+
+sprite_cache = AssetCache(SPRITE_CACHE_BYTES)
+
+# Resized frames of static clips, see `Resize`.
+RESIZE_CACHE_BYTES = 256 << 20
+
+resize_cache = AssetCache(RESIZE_CACHE_BYTES)
+
+# The scale assets are decoded at for a preview render, e.g.
+# `PREVIEW_SCALE=0.25 python templates/balloonpop.py`. Clips are then built,
+# and their effects run, at proxy resolution; see `Movie.render`. Sizes
+# given to `Resize` are scaled with them, those given to vfx.Resize are not.
+PREVIEW_SCALE = float(os.environ.get('PREVIEW_SCALE', 1))
+
+def image_clip(path, size=None, preview_scale=None):
+    """An ImageClip of an image file, decoded and resized once per process.
+
+    `size` is a (width, height) or a scale factor, as for `vfx.Resize`.
+    The image is decoded at `size` times `preview_scale`, PREVIEW_SCALE
+    unless given."""
+    preview_scale = PREVIEW_SCALE if preview_scale is None else preview_scale
+    size = _preview_size(size, preview_scale)
+    img, alpha = asset_cache.get(_asset_key(path, size, 'image'), lambda: _load_image(path, size))
+    clip = ImageClip(img)
+    if alpha is not None:
+        clip = clip.with_mask(ImageClip(alpha, is_mask=True))
+    clip.proxy_scale = preview_scale
+    return clip
+
+def video_clip(path, size=None, has_mask=False, preview_scale=None):
+    """A clip of a video or gif file, decoded and resized once per process.
+
+    Frames are served from memory like VideoFileClip serves them from the
+    decoder. Files whose decoded frames would not fit in the asset cache
+    fall back to a VideoFileClip. Frames are decoded at `size` times
+    `preview_scale`, as for `image_clip`."""
+    preview_scale = PREVIEW_SCALE if preview_scale is None else preview_scale
+    size = _preview_size(size, preview_scale)
+    key = _asset_key(path, size, 'video', has_mask)
+    source = VideoFileClip(str(path), has_mask=has_mask) if key not in asset_cache else None
+    if source is not None:
+        w, h = _target_size(source.size, size)
+        # uint8 RGB plus a float32 mask per pixel
+        if source.reader.n_frames * w * h * (7 if has_mask else 3) > asset_cache.max_bytes:
+            clip = source.resized((w, h)) if (w, h) != tuple(source.size) else source
+            clip.proxy_scale = preview_scale
+            return clip
+
+    frames, alphas, fps, duration = asset_cache.get(key, lambda: _load_video(source, size))
+    if source is not None:
+        source.close()
+
+    def frame_index(t):
+        # The frame FFMPEG_VideoReader.get_frame returns for `t`.
+        return min(int(fps * t + 0.00001), len(frames) - 1)
+
+    clip = VideoClip(lambda t: frames[frame_index(t)], duration=duration)
+    clip.fps = fps
+    if alphas is not None:
+        clip = clip.with_mask(VideoClip(lambda t: alphas[frame_index(t)], is_mask=True, duration=duration))
+    clip.proxy_scale = preview_scale
+    return clip
+
+def asset_clip(path):
+    """An image_clip or, for other files, a video_clip of an asset."""
+    suffix = os.path.splitext(str(path))[1].lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return image_clip(path)
+    return video_clip(path, has_mask=suffix == '.gif')
+
+def asset_size(path):
+    """The (width, height) of an image or video file, read from its header
+    without decoding any frames, e.g. to pick the size to load it at."""
+    suffix = os.path.splitext(str(path))[1].lower()
+    if suffix in IMAGE_EXTENSIONS:
+        with Image.open(path) as image:
+            return image.size
+    return tuple(ffmpeg_parse_infos(str(path))['video_size'])
+
+def _asset_key(path, size, *kind):
+    path = os.path.abspath(path)
+    size = tuple(size) if isinstance(size, (list, tuple)) else size
+    return (path, os.stat(path).st_mtime_ns, size) + kind
+
+def _preview_size(size, preview_scale):
+    """`size`, as given to image_clip, scaled by `preview_scale`."""
+    if preview_scale == 1:
+        return size
+    if size is None:
+        return preview_scale
+    if isinstance(size, (int, float)):
+        return size * preview_scale
+    return (size[0] * preview_scale, size[1] * preview_scale)
+
+def _proxy_scale(clip):
+    """The preview scale `clip` was built at, see PREVIEW_SCALE.
+
+    Sizes and positions given to effects are full-resolution pixels, so
+    effects scale them by this to the clip's frames."""
+    return getattr(clip, 'proxy_scale', 1)
+
+def _target_size(source_size, size):
+    w, h = source_size
+    if size is None:
+        return w, h
+    if isinstance(size, (int, float)):
+        size = (w * size, h * size)
+    return int(size[0]), int(size[1])
+
+def _resized(array, size):
+    """Resize like vfx.Resize does, with Lanczos on uint8 planes."""
+    if (array.shape[1], array.shape[0]) == size:
+        return array
+    return np.array(Image.fromarray(array).resize(size, Image.Resampling.LANCZOS))
+
+def _mask(alpha):
+    return alpha.astype(np.float32) / np.float32(255)
+
+def _load_image(path, size):
+    image = Image.open(path)
+    has_alpha = image.has_transparency_data
+    array = np.array(image.convert('RGBA' if has_alpha else 'RGB'))
+    size = _target_size((array.shape[1], array.shape[0]), size)
+    img = _resized(np.ascontiguousarray(array[..., :3]), size)
+    alpha = _mask(_resized(np.ascontiguousarray(array[..., 3]), size)) if has_alpha else None
+    return img, alpha
+
+def _load_video(source, size):
+    reader = source.reader
+    size = _target_size(source.size, size)
+    frames, alphas = [], []
+    for frame_index in range(reader.n_frames):
+        frame = reader.get_frame(frame_index / reader.fps)
+        frames.append(_resized(np.ascontiguousarray(frame[..., :3]), size))
+        if frame.shape[2] == 4:
+            alphas.append(_mask(_resized(np.ascontiguousarray(frame[..., 3]), size)))
+    return np.stack(frames), np.stack(alphas) if alphas else None, reader.fps, source.duration
+
 def add_page(name='', **kwargs):
     with movie.page(name=name, **kwargs) as page:
         return page
@@ -133,10 +884,9 @@ def add_elem(clip, pagenum=0, duration=0, with_=None, **kwargs):
 def _get_page_background_clip(page, page_start_time, size):
     if '.png' in page.background or '.jpg' in page.background:
         return (
-            ImageClip(page.background)
+            image_clip(page.background, size, preview_scale=1)
             .with_start(page_start_time)
             .with_duration(page.duration)
-            .with_effects([vfx.Resize(size)])
         )
     elif '.mp4' in page.background:
         return (
@@ -156,23 +906,350 @@ def _get_page_background_clip(page, page_start_time, size):
             .with_duration(page.duration)
         )
 
-def render_pages(output='output.mp4', aspect_ratio='16:9', fps=30, resolution='1080p', filter='', extra_vclips=None, extra_aclips=None):
-    return movie.render(output=output, aspect_ratio=aspect_ratio, fps=fps, resolution=resolution, filter=filter, extra_vclips=extra_vclips, extra_aclips=extra_aclips)
+# Code of the position functions moviepy sets for fixed positions.
+_FIXED_POSITION_CODES = {
+    ColorClip((1, 1)).pos.__code__,
+    ColorClip((1, 1)).with_position((0, 0)).pos.__code__,
+}
+
+def _is_static_layer(clip):
+    """Whether the clip shows the same pixels at the same place on every frame.
+
+    ImageClip.transform returns a plain VideoClip, so any time-dependent
+    effect on an ImageClip, or on its mask, disqualifies it."""
+    return (
+        isinstance(clip, ImageClip)
+        and (clip.mask is None or isinstance(clip.mask, ImageClip))
+        and _has_fixed_position(clip.pos)
+    )
+
+def _has_fixed_position(pos):
+    return getattr(pos, '__code__', None) in _FIXED_POSITION_CODES
+
+def _has_named_position(pos):
+    """Whether the clip is placed by moviepy names like 'center' or 'top',
+    which are resolved against the background when compositing."""
+    xy = pos(0)
+    return isinstance(xy, str) or any(isinstance(v, str) for v in xy)
+
+def _flatten_static_layers(clips, size):
+    """Merge runs of adjacent static layers into pre-composited plates.
+
+    Adjacent static layers that share start, end and layer index blend to
+    the same pixels on every frame, so they are blended once here and the
+    dynamic layers are composited on top of the plate."""
+    flattened, run = [], []
+
+    def flush():
+        if len(run) > 1:
+            plate = _composite_plate(run, size)
+            if plate is not None:
+                flattened.append(plate)
+        else:
+            flattened.extend(run)
+        run.clear()
+
+    for clip in clips:
+        if not _is_static_layer(clip):
+            flush()
+            flattened.append(clip)
+            continue
+        if run and (clip.start, clip.end, clip.layer_index) != (run[0].start, run[0].end, run[0].layer_index):
+            flush()
+        run.append(clip)
+    flush()
+    return flattened
+
+def _composite_plate(clips, size):
+    """Composite static clips once, cropped to the pixels they cover."""
+    start = clips[0].start
+    composite = CompositeVideoClip(clips, size=size)
+    frame = composite.get_frame(start)
+    alpha = composite.mask.get_frame(start)
+
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if not len(rows):
+        return None
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    mask = ImageClip(alpha[y0:y1, x0:x1].astype(np.float32), is_mask=True)
+    return (
+        ImageClip(frame[y0:y1, x0:x1])
+        .with_mask(mask)
+        .with_position((int(x0), int(y0)))
+        .with_start(start)
+        .with_end(clips[0].end)
+        .with_layer_index(clips[0].layer_index)
+    )
+
+def _proxy_clip(clip, scale):
+    """Place a clip on the canvas of a proxy render at `scale`.
+
+    Positions are full-resolution pixels, so they are scaled here. Clips
+    built at the preview scale, see PREVIEW_SCALE, already have frames of
+    the proxy size. Frames of any other clip are scaled as they are
+    rendered, by their own size so that size animations are kept, and
+    ImageClips once."""
+    pos = clip.pos
+    remaining = scale / _proxy_scale(clip)
+    if remaining != 1:
+        clip = clip.image_transform(lambda frame: _scale_frame(frame, remaining), apply_to=['mask'])
+    if clip.relative_pos:
+        return clip
+    if _has_fixed_position(pos):
+        return clip.with_position(_scale_position(pos(0), scale))
+    return clip.with_position(lambda t: _scale_position(pos(t), scale))
+
+def _scale_frame(frame, scale):
+    h, w = frame.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    # Masks are resized as floats, images as the uint8 they are blitted as.
+    frame = frame.astype(np.uint8 if frame.ndim == 3 else np.float32, copy=False)
+    return np.array(Image.fromarray(frame).resize(size, Image.BILINEAR))
+
+def _scale_position(pos, scale):
+    if isinstance(pos, str):
+        return pos
+    return tuple(v if isinstance(v, str) else v * scale for v in pos)
+
+def render_pages(output='output.mp4', aspect_ratio='16:9', fps=30, resolution='1080p', filter='', extra_vclips=None, extra_aclips=None, workers=1, segment='page'):
+    return movie.render(output=output, aspect_ratio=aspect_ratio, fps=fps, resolution=resolution, filter=filter, extra_vclips=extra_vclips, extra_aclips=extra_aclips, workers=workers, segment=segment)
 
 def render_each_page(output, *args, **kwargs):
     return movie.render_each_page(output, *args, **kwargs)
 
 @dataclass
 class Blur(Effect):
-    sigma: float = 3.0
+    """Gaussian blur, with `sigma` constant or a function of time.
+
+    Masked clips are blurred premultiplied, so transparent pixels do not
+    bleed dark fringes into the edges, and the mask is blurred with them.
+    A static clip with a constant sigma is blurred once.
+    """
+    sigma: Union[float, Callable[[float], float]] = 3.0
 
     def apply(self, clip):
+        # Sigma is in full-resolution pixels.
+        scale = _proxy_scale(clip)
+        sigma_at = (lambda t: self.sigma(t) * scale) if callable(self.sigma) else (lambda t: self.sigma * scale)
+        mask = clip.mask
+
+        if not callable(self.sigma) and isinstance(clip, ImageClip) and (mask is None or isinstance(mask, ImageClip)):
+            img, alpha = _blur_layer(clip.get_frame(0), mask.get_frame(0) if mask else None, sigma_at(0))
+            new_clip = clip.image_transform(lambda _: img)
+            if mask is not None:
+                new_clip.mask = mask.image_transform(lambda _: alpha)
+            return new_clip
+
+        if mask is None:
+            return clip.transform(lambda get_frame, t: _blur_layer(get_frame(t), None, sigma_at(t))[0])
+
+        # The image pass blurs the mask to unpremultiply; the mask pass
+        # reuses it for the same t.
+        last = _Memo()
+
         def blur(get_frame, t):
-            frame = get_frame(t)
-            img = Image.fromarray(frame)
-            return np.array(img.filter(ImageFilter.GaussianBlur(self.sigma)))
+            img, last['alpha'] = _blur_layer(get_frame(t), mask.get_frame(t), sigma_at(t))
+            last['t'] = t
+            return img
+
+        def blur_mask(get_frame, t):
+            if last.get('t') == t:
+                return last['alpha']
+            return gaussian_blur(get_frame(t), sigma_at(t))
+
+        new_clip = clip.transform(blur)
+        new_clip.mask = mask.transform(blur_mask)
+        return new_clip
+
+def _blur_layer(frame, mask, sigma):
+    """Blur an image frame and its mask, premultiplied by the mask."""
+    if mask is None:
+        return _to_uint8(gaussian_blur(frame, sigma)), None
+    premultiplied = frame[..., :3] * np.asarray(mask, dtype=np.float32)[..., None]
+    color = gaussian_blur(premultiplied, sigma)
+    alpha = gaussian_blur(mask, sigma)
+    color /= np.maximum(alpha, np.float32(1e-6))[..., None]
+    return _to_uint8(color), alpha
+
+def _to_uint8(array):
+    np.rint(array, out=array)
+    np.clip(array, 0, 255, out=array)
+    return array.astype(np.uint8)
+
+@functools.lru_cache(maxsize=256)
+def _gaussian_kernel(sigma):
+    radius = max(1, math.ceil(3 * sigma))
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-x * x / np.float32(2 * sigma * sigma))
+    kernel /= kernel.sum()
+    kernel.setflags(write=False)
+    return kernel
+
+def gaussian_blur(array, sigma):
+    """Separable Gaussian blur of an HxW or HxWxC array, as float32.
+
+    Large sigmas are blurred on a copy decimated by a power of two, which
+    the blur hides, and upsampled back. Kernels are cached by sigma.
+    """
+    array = np.asarray(array, dtype=np.float32)
+    if sigma <= 0:
+        return array.copy()
+
+    h, w = array.shape[:2]
+    factor = 2 ** max(0, int(math.log2(sigma / 1.5)))
+    if factor > 1:
+        if h % factor or w % factor:
+            pad = [(0, -h % factor), (0, -w % factor)] + [(0, 0)] * (array.ndim - 2)
+            array = np.pad(array, pad, mode='edge')
+        blocks = array[::factor, ::factor].copy()
+        for dy, dx in itertools.product(range(factor), repeat=2):
+            if dy or dx:
+                blocks += array[dy::factor, dx::factor]
+        array = blocks
+        array *= np.float32(1 / (factor * factor))
+        # Block averaging and bilinear upsampling blur by a variance of
+        # about 1/4 pixel of the decimated copy.
+        sigma = math.sqrt(max((sigma / factor) ** 2 - 0.25, 0.25))
+
+    kernel = _gaussian_kernel(round(sigma, 2))
+    blurred = ndimage.correlate1d(array, kernel, axis=0, mode='nearest')
+    blurred = ndimage.correlate1d(blurred, kernel, axis=1, mode='nearest')
+    if factor == 1:
+        return blurred
+
+    size = (blurred.shape[1] * factor, blurred.shape[0] * factor)
+    planes = blurred.reshape(blurred.shape[:2] + (-1,))
+    upsampled = np.empty((h, w, planes.shape[2]), dtype=np.float32)
+    for c in range(planes.shape[2]):
+        plane = Image.fromarray(np.ascontiguousarray(planes[..., c])).resize(size, Image.BILINEAR)
+        upsampled[..., c] = np.asarray(plane)[:h, :w]
+    return upsampled.reshape((h, w) + blurred.shape[2:])
+
+# Trajectories are sampled this often; lookups between samples interpolate.
+TRAJECTORY_FPS = 120
+
+class Trajectory:
+    """A clip's motion, sampled into a table of x, y, scale, angle and
+    opacity at TRAJECTORY_FPS.
+
+    `sample(times)` returns one row per time. It is vectorized, so effects
+    compose by array arithmetic over their base trajectory and the whole
+    chain is evaluated once, when the table is built. A Trajectory is a
+    position function, so it can be passed to `with_position`.
+    """
+    CHANNELS = ('x', 'y', 'scale', 'angle', 'opacity')
+
+    def __init__(self, sample, duration=None):
+        self.sample = sample
+        self.duration = duration
+        self._table = None
+
+    @classmethod
+    def of(cls, clip):
+        """The trajectory of the clip's current position."""
+        pos = clip.pos
+        if isinstance(pos, Trajectory):
+            return pos
+        if _has_named_position(pos):
+            raise ValueError(f'No trajectory for a clip placed at {pos(0)!r}; use pixel coordinates')
+        if _has_fixed_position(pos):
+            x, y = pos(0)
+            return cls.still(x, y, clip.duration)
+
+        def sample(times):
+            return _rows(np.array([pos(t) for t in times], dtype=float).reshape(-1, 2))
+        return cls(sample, clip.duration)
+
+    @classmethod
+    def still(cls, x, y, duration=None):
+        return cls(lambda times: _rows(np.broadcast_to((float(x), float(y)), (len(times), 2))), duration)
+
+    @classmethod
+    def keyframes(cls, times, **channels):
+        """Piecewise-linear channels through keyframes, e.g.
+        Trajectory.keyframes([0, 1, 2], x=[0, 100, 100], opacity=[0, 1, 0])."""
+        keys = np.asarray(times, dtype=float)
+
+        def sample(times):
+            rows = _rows(np.zeros((len(times), 2)))
+            for channel, values in channels.items():
+                rows[:, cls.CHANNELS.index(channel)] = np.interp(times, keys, values)
+            return rows
+        return cls(sample, float(keys[-1]))
+
+    def offset(self, delta):
+        """This trajectory plus `delta(times)`, an (n, 5) or (n, 2) array
+        added to the leading channels."""
+        def sample(times):
+            rows = self.sample(times)
+            change = delta(times)
+            rows[:, :change.shape[1]] += change
+            return rows
+        return Trajectory(sample, self.duration)
+
+    def table(self, t=0):
+        """The sampled table, covering at least [0, max(t, duration)]."""
+        needed = math.ceil(max(t, self.duration or 0) * TRAJECTORY_FPS) + 2
+        if self._table is None or len(self._table) < needed:
+            if self._table is not None:
+                needed = max(needed, 2 * len(self._table))
+            self._table = self.sample(np.arange(needed) / TRAJECTORY_FPS)
+            self._table.setflags(write=False)
+        return self._table
+
+    def at(self, t):
+        """All channels at time t."""
+        table = self.table(t)
+        i, frac = divmod(max(t, 0) * TRAJECTORY_FPS, 1)
+        i = int(i)
+        if frac < 1e-6:
+            return table[i]
+        return table[i] + (table[i + 1] - table[i]) * frac
+
+    def __call__(self, t):
+        x, y = self.at(t)[:2]
+        return (x, y)
+
+    def scale_at(self, t):
+        return self.at(t)[2]
+
+    def angle_at(self, t):
+        return self.at(t)[3]
+
+    def opacity_at(self, t):
+        return self.at(t)[4]
+
+def _rows(xy):
+    """Trajectory rows for positions, with unit scale and opacity."""
+    rows = np.zeros((len(xy), len(Trajectory.CHANNELS)))
+    rows[:, :2] = xy
+    rows[:, 2] = 1
+    rows[:, 4] = 1
+    return rows
 
-        return clip.transform(blur)
+@dataclass
+class Animate(Effect):
+    """Drive a clip's position, scale, rotation and opacity from a
+    Trajectory, e.g. one from Trajectory.keyframes."""
+    trajectory: Trajectory
+
+    def apply(self, clip):
+        trajectory = self.trajectory
+        table = trajectory.table(clip.duration or 0)
+        clip = clip.with_position(trajectory)
+        if np.any(table[:, 2] != 1):
+            clip = clip.with_effects([Resize(trajectory.scale_at)])
+        if np.any(table[:, 3] != 0):
+            clip = clip.with_effects([vfx.Rotate(trajectory.angle_at)])
+        if np.any(table[:, 4] != 1):
+            if clip.mask is None:
+                clip = clip.with_mask()
+            clip.mask = clip.mask.transform(
+                lambda get_frame, t: get_frame(t) * np.float32(trajectory.opacity_at(t))
+            )
+        return clip
 
 @dataclass
 class FloatAnimation(Effect):
@@ -180,18 +1257,26 @@ class FloatAnimation(Effect):
     scale: float = 10.0
 
     def apply(self, clip):
-        if self.axis == 'x':
-            return clip.with_position(lambda t: (
-                clip.pos(t)[0] - self.scale * math.sin(3 * t),
-                clip.pos(t)[1]
-            ))
-        elif self.axis == 'y':
-            return clip.with_position(lambda t: (
-                clip.pos(t)[0],
-                clip.pos(t)[1] - self.scale * math.sin(3 * t)
-            ))
-        else:
+        if self.axis not in ('x', 'y'):
             raise ValueError(f"Invalid axis: {self.axis}")
+        column = 0 if self.axis == 'x' else 1
+
+        if _has_named_position(clip.pos):
+            # Named coordinates are resolved when compositing, so offset
+            # the floating axis frame by frame and pass the other through.
+            pos = clip.pos
+
+            def position(t):
+                xy = list(pos(t))
+                xy[column] = xy[column] - self.scale * math.sin(3 * t)
+                return tuple(xy)
+            return clip.with_position(position)
+
+        def delta(times):
+            change = np.zeros((len(times), 2))
+            change[:, column] = -self.scale * np.sin(3 * times)
+            return change
+        return clip.with_position(Trajectory.of(clip).offset(delta))
 
 
 
@@ -235,6 +1320,12 @@ class Swing(Effect):
     bg_color : tuple, optional
         Color for area outside the rotated image.
         Default is None.
+
+    resolution : float, optional
+        Angle step, in degrees, of the sprite bank used for static sources
+        such as ImageClips. Each frame then looks up the sprite rotated to
+        the nearest step instead of rotating the source. 0 rotates every
+        frame. Default is 0.25.
     """
     
     start_angle: float
@@ -246,6 +1337,7 @@ class Swing(Effect):
     center: tuple = None
     translate: tuple = None
     bg_color: tuple = None
+    resolution: float = 0.25
 
     def apply(self, clip: Clip) -> Clip:
         """Apply the swinging effect to the clip."""
@@ -279,11 +1371,7 @@ class Swing(Effect):
             
             return angle
 
-        def filter(get_frame, t):
-            # Get current angle for this frame
-            angle = get_swing_angle(t)
-            im = get_frame(t)
-
+        def rotate(im, angle):
             # Handle special cases for common angles
             angle %= 360
             if not self.center and not self.translate and not self.bg_color:
@@ -307,8 +1395,8 @@ class Swing(Effect):
             if self.translate is not None:
                 pillow_kwargs["translate"] = self.translate
 
-            # Handle mask images (float64 type)
-            if im.dtype == "float64":
+            # Handle mask images (float type)
+            if np.issubdtype(im.dtype, np.floating):
                 scale_factor = 255.0
             else:
                 scale_factor = 1
@@ -325,61 +1413,183 @@ class Swing(Effect):
 
             return rotated
 
-        return clip.transform(filter, apply_to=["mask"])
+        def make_filter(static):
+            if not static or not self.resolution:
+                return lambda get_frame, t: rotate(get_frame(t), get_swing_angle(t))
+
+            def filter(get_frame, t):
+                # A static clip returns the same array for every t, so it
+                # keys the sprites of its own rotations.
+                im = get_frame(t)
+                angle = round(get_swing_angle(t) / self.resolution) * self.resolution
+                key = ('swing', id(im), angle, resample, self.expand, self.center, self.translate, self.bg_color)
+                # The source is kept with its sprites so its id is not reused.
+                rotated, _ = sprite_cache.get(key, lambda: (_as_frame(rotate(im, angle), im), (im,)))
+                return rotated
+            return filter
+
+        new_clip = clip.transform(make_filter(isinstance(clip, ImageClip)))
+        if clip.mask is not None:
+            new_clip.mask = clip.mask.transform(make_filter(isinstance(clip.mask, ImageClip)))
+        return new_clip
+
+def _as_frame(array, like):
+    """Store image frames as uint8, as they are composited, and masks as
+    float32."""
+    if like.dtype == np.uint8 or array.ndim == 3:
+        return array.astype(np.uint8)
+    return array.astype(np.float32)
 
 
-# This implemenentation is slow.
-# Also, it shows a black bg.
 @dataclass
 class Flip(Effect):
+    """Spin the clip like a card, one full turn per `duration` seconds.
+
+    `rotation_axis` is 'vertical' (the card turns left-right) or
+    'horizontal' (top-bottom). `perspective` > 0 shrinks the far edge,
+    e.g. 0.3. The uncovered area is transparent.
+    """
     duration: float
     rotation_axis: str = 'vertical'
+    perspective: float = 0.0
 
     def apply(self, clip: Clip) -> Clip:
-        def make_frame(get_frame, t):
-            img = get_frame(t)
-            img_width, img_height = img.shape[1], img.shape[0]
+        axis = 1 if self.rotation_axis == 'vertical' else 0
+        opaque = clip.mask is None
+        if opaque:
+            clip = clip.with_mask()
+        # The image and mask passes gather with the same index map.
+        last = _Memo()
+
+        def index_map(shape, t):
+            if last.get('key') != (shape, t):
+                step = round(t / self.duration * _FLIP_STEPS) % _FLIP_STEPS
+                last['key'] = (shape, t)
+                last['map'] = _flip_map(shape, axis, step, self.perspective)
+            return last['map']
+
+        def flip(get_frame, t):
+            frame = get_frame(t)
+            index, _ = index_map(frame.shape[:2], t)
+            if index.ndim == 1:
+                return np.take(frame, index, axis=axis)
+            return np.take(frame.reshape(-1, *frame.shape[2:]), index, axis=0)
+
+        def flip_mask(get_frame, t):
+            if opaque:
+                shape = clip.size[::-1]
+                return np.broadcast_to(index_map(shape, t)[1], shape).astype(np.float32)
+            mask = flip(get_frame, t)
+            _, valid = index_map(mask.shape[:2], t)
+            return np.multiply(mask, valid, dtype=np.float32)
+
+        new_clip = clip.transform(flip)
+        new_clip.mask = clip.mask.transform(flip_mask)
+        return new_clip
+
+_FLIP_STEPS = 1440
+
+@functools.lru_cache(maxsize=4096)
+def _flip_table(length, step, perspective):
+    """Source index, validity and cross-axis stretch for each output line
+    along the flipped axis, at rotation `step` of `_FLIP_STEPS`."""
+    angle = 2 * math.pi * step / _FLIP_STEPS
+    cos, sin = abs(math.cos(angle)), math.sin(angle)
+    half = length / 2
+    # Output coordinate X in [-1, 1] shows source coordinate x, where
+    # X = x * cos / (1 + perspective * x * sin).
+    out = (np.arange(length) + 0.5 - half) / half
+    denom = cos - perspective * sin * out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        src = out / denom
+    valid = (denom > 1e-6) & (np.abs(src) <= 1)
+    src = np.where(valid, src, 0)
+    index = np.clip(np.floor((src + 1) * half), 0, length - 1).astype(np.intp)
+    stretch = (1 + perspective * sin * src).astype(np.float32)
+    for array in (index, valid, stretch):
+        array.setflags(write=False)
+    return index, valid, stretch
+
+def _flip_map(shape, axis, step, perspective):
+    """Gather indices for one Flip frame: a 1-D index along `axis`, or flat
+    indices into the (h*w, ...) frame when perspective varies the other
+    axis per line. Also returns the (h, w) validity map."""
+    index, valid, stretch = _flip_table(shape[axis], step, perspective)
+    other = shape[1 - axis]
+    if not perspective:
+        return index, np.expand_dims(valid, 1 - axis)
+
+    # The far side of the card is shorter: each line samples the other
+    # axis stretched about its centre.
+    offsets = np.arange(other, dtype=np.float32) + np.float32(0.5 - other / 2)
+    if axis == 1:
+        src = np.multiply.outer(offsets, stretch)
+        inside = np.less_equal.outer(np.abs(offsets), other / 2 / stretch)
+        valid = inside & valid
+    else:
+        src = np.multiply.outer(stretch, offsets)
+        inside = np.greater_equal.outer(other / 2 / stretch, np.abs(offsets))
+        valid = inside & valid[:, None]
+    src += np.float32(other / 2)
+    np.clip(src, 0, other - 1, out=src)
+    flat = src.astype(np.int32)
+    if axis == 1:
+        flat *= shape[1]
+        flat += index.astype(np.int32)
+    else:
+        flat += (index * shape[1]).astype(np.int32)[:, None]
+    return flat, valid
 
-            # Calculate rotation angle based on time
-            angle = (t / self.duration) * 360  # Complete 360-degree rotation
-            
-            # Create transformation matrix
-            if self.rotation_axis == 'vertical':
-                # Scale factor changes based on sine of angle to simulate perspective
-                scale = abs(np.cos(np.radians(angle)))
-                new_width = int(img_width * scale)
-                if new_width < 1:  # Prevent width from becoming 0
-                    new_width = 1
-                
-                # Resize image based on perspective
-                frame = resize(img, (img_height, new_width), anti_aliasing=True)
-                
-                # Create background
-                background = np.zeros((img_height, img_width, 3), dtype=np.uint8)
-                
-                # Calculate position to paste the resized image
-                x_offset = (img_width - new_width) // 2
-                background[:, x_offset:x_offset + new_width] = frame
-                
-            else:  # horizontal rotation
-                # Scale factor changes based on sine of angle to simulate perspective
-                scale = abs(np.cos(np.radians(angle)))
-                new_height = int(img_height * scale)
-                if new_height < 1:  # Prevent height from becoming 0
-                    new_height = 1
-                
-                # Resize image based on perspective
-                frame = resize(img, (img_width, new_height), anti_aliasing=True)
-                
-                # Create background
-                background = np.zeros((img_height, img_width, 3), dtype=np.uint8)
-                
-                # Calculate position to paste the resized image
-                y_offset = (img_height - new_height) // 2
-                background[y_offset:y_offset + new_height, :] = frame
-            
-            return background
-        return clip.transform(make_frame)
+@dataclass
+class Resize(Effect):
+    """Drop-in for vfx.Resize that memoizes the frames of static clips.
+
+    Sizes that vary with time mostly cycle through a few integer sizes, so
+    an ImageClip is resized once per distinct size rather than every frame.
+    """
+    new_size: Union[Tuple[int, int], float, Callable] = None
+    resample: int = Image.Resampling.LANCZOS
+
+    def apply(self, clip):
+        w, h = clip.size
+        scale = _proxy_scale(clip)
+
+        def target_size(t):
+            size = self.new_size(t) if callable(self.new_size) else self.new_size
+            size = _scaled(size, w, h, scale)
+            return (max(1, int(size[0])), max(1, int(size[1])))
+
+        def make_filter(static):
+            def filter(get_frame, t):
+                frame = get_frame(t)
+                size = target_size(t)
+                if not static:
+                    return resize_frame(frame, size, self.resample)
+                # The key holds on to the source so its id stays unique.
+                key = ('resize', id(frame), size, self.resample)
+                resized, _ = resize_cache.get(key, lambda: (resize_frame(frame, size, self.resample), (frame,)))
+                return resized
+            return filter
+
+        def resize(clip):
+            if not callable(self.new_size):
+                size = target_size(0)
+                return clip.image_transform(lambda frame: resize_frame(frame, size, self.resample))
+            return clip.transform(make_filter(isinstance(clip, ImageClip)))
+
+        new_clip = resize(clip)
+        if clip.mask is not None:
+            new_clip.mask = resize(clip.mask)
+        return new_clip
+
+def resize_frame(frame, size, resample=Image.Resampling.LANCZOS):
+    """Resize an image frame (as uint8) or a mask (as float32) to `size`."""
+    if (frame.shape[1], frame.shape[0]) == tuple(size):
+        return frame
+    if frame.ndim == 2 and frame.dtype != np.uint8:
+        resized = np.asarray(Image.fromarray(frame.astype(np.float32)).resize(size, resample))
+        return np.clip(resized, 0, 1)
+    return np.asarray(Image.fromarray(frame.astype(np.uint8)).resize(size, resample))
 
 @dataclass
 class SquishBounceEffect(Effect):
@@ -390,23 +1600,30 @@ class SquishBounceEffect(Effect):
     #:param amplitude: Maximum stretch/squish factor by unit vector.
     amplitude: float = 10
 
+    def size_at(self, w, h, t, scale=1):
+        """The squished size of a w x h clip at t, or at an array of times,
+        for a clip built at preview `scale`."""
+        phase = 2 * np.pi * self.frequency * np.asarray(t)
+        return np.trunc(w + 10 * scale * np.sin(phase)).astype(int), np.trunc(h + 10 * scale * np.cos(phase)).astype(int)
+
+    def offset(self, w, h, scale=1):
+        # fix the left bottom corner, in full-resolution pixels
+        def delta(times):
+            new_w, new_h = self.size_at(w, h, times, scale)
+            return np.stack([w - new_w, h - new_h], axis=1) / scale
+        return delta
+
     def apply(self, clip):
         w, h = clip.size
+        scale = _proxy_scale(clip)
         def resize(t):
-            new_w = int(w + 10 * np.sin(2 * np.pi * self.frequency * t))
-            new_h = int(h + 10 * np.cos(2 * np.pi * self.frequency * t))
-            return (new_w, new_h)
-        # fix the left bottom corner
-        def newpos(t):
-            x, y = clip.pos(t)
-            new_w = int(w + 10 * np.sin(2 * np.pi * self.frequency * t))
-            new_h = int(h + 10 * np.cos(2 * np.pi * self.frequency * t))
-            delta_w = new_w - w
-            delta_h = new_h - h
-            return x - delta_w, y - delta_h
+            new_w, new_h = self.size_at(w, h, t, scale)
+            # Resize scales full-resolution sizes by `scale` and truncates,
+            # so these are half a frame pixel over to come back exact.
+            return ((new_w + 0.5) / scale, (new_h + 0.5) / scale)
         return clip.with_effects([
-            vfx.Resize(resize),
-        ]).with_position(newpos)
+            Resize(resize),
+        ]).with_position(Trajectory.of(clip).offset(self.offset(w, h, scale)))
 
 @dataclass
 class UniformMotion(Effect):
@@ -414,11 +1631,11 @@ class UniformMotion(Effect):
     to_position: tuple
 
     def apply(self, clip):
-        def newpos(t):
-            x = int(self.from_position[0] + (self.to_position[0] - self.from_position[0]) * t/clip.duration)
-            y = int(self.from_position[1] + (self.to_position[1] - self.from_position[1]) * t/clip.duration)
-            return x, y
-        return clip.with_position(newpos)
+        start, end = np.asarray(self.from_position, dtype=float), np.asarray(self.to_position, dtype=float)
+
+        def sample(times):
+            return _rows(np.trunc(start + np.multiply.outer(times / clip.duration, end - start)))
+        return clip.with_position(Trajectory(sample, clip.duration))
 
 @dataclass
 class UniformScale(Effect):
@@ -432,131 +1649,475 @@ class UniformScale(Effect):
             if t >= duration:
                 return self.to_scale
             return self.from_scale + (self.to_scale - self.from_scale) * t/duration
-        return clip.resized(get_size)
+        return clip.with_effects([Resize(get_size)])
 
 
 
 @dataclass
 class RemoveColor(Effect):
+    """Key out `color`, e.g. a green screen.
+
+    Pixels within `tolerance` (RGB distance) of the colour become
+    transparent and fade back in over `softness`. `spill` (0-1) pulls the
+    colour's tint out of what remains, e.g. green fringes on hair.
+    """
     color: Tuple[int, int, int]
+    tolerance: float = 0
+    softness: float = 0
+    spill: float = 0
 
     def apply(self, clip):
-        def transform(frame):
-            frame = np.array(frame, copy=True)
-            mask = np.all(frame[..., :3] == np.array(self.color[:3]), axis=-1)
-            if frame.shape[-1] == 3:
-                alpha = np.ones(frame.shape[:2], dtype=np.uint8) * 255
-                frame = np.dstack((frame, alpha))
-
-            frame[mask, 3] = 0  # Set alpha to 0 where mask is True
-            return frame.astype(np.uint8)
-
-            #mask = np.all(frame == np.array(self.color), axis=-1)
-            #frame = frame.astype(np.uint8) * ~mask[:, :, None]
-            #frame[mask, 3] = 0
-            #frame = np.dstack((frame, (~mask * 255).astype(np.uint8)))
-            #mask = np.all(frame == self.color, axis=-1)
-            #frame[mask] = [0, 0, 0, 0]
-            return frame
-        return clip.image_transform(transform)
-
-# Buggy implementation, not working.
+        color = tuple(int(c) for c in self.color[:3])
+        alpha_lut = _key_alpha_lut(color, float(self.tolerance), float(self.softness))
+        spill_lut = _key_spill_lut(float(self.spill)) if self.spill else None
+        dominant = int(np.argmax(color))
+        others = [c for c in range(3) if c != dominant]
+        buffers = _Memo()
+
+        def key(frame):
+            frame = frame[..., :3]
+            if frame.dtype != np.uint8:
+                # e.g. float frames from Swing(resolution=0).
+                frame = np.clip(np.rint(frame), 0, 255).astype(np.uint8)
+            packed = buffers.get('packed')
+            if packed is None or packed.shape != frame.shape[:2]:
+                packed = buffers['packed'] = np.empty(frame.shape[:2], dtype=np.uint32)
+                buffers['scratch'] = np.empty(frame.shape[:2], dtype=np.uint32)
+            scratch = buffers['scratch']
+            np.multiply(frame[..., 0], np.uint32(1 << 16), out=packed)
+            np.multiply(frame[..., 1], np.uint32(1 << 8), out=scratch)
+            packed += scratch
+            np.add(packed, frame[..., 2], out=packed)
+            alpha = np.multiply(np.take(alpha_lut, packed), np.float32(1 / 255))
+
+            if spill_lut is None:
+                return frame, alpha
+            # Clamp the key channel towards the stronger of the other two.
+            limit = np.maximum(frame[..., others[0]], frame[..., others[1]])
+            np.multiply(frame[..., dominant], np.uint32(256), out=scratch)
+            scratch += limit
+            frame = frame.copy()
+            frame[..., dominant] = np.take(spill_lut, scratch)
+            return frame, alpha
+
+        def keyed_mask(alpha, mask):
+            if mask is None:
+                return alpha
+            return np.multiply(alpha, mask, dtype=np.float32)
+
+        if isinstance(clip, ImageClip) and (clip.mask is None or isinstance(clip.mask, ImageClip)):
+            img, alpha = key(clip.get_frame(0))
+            mask = keyed_mask(alpha, clip.mask.get_frame(0) if clip.mask else None)
+            return clip.image_transform(lambda _: img).with_mask(ImageClip(mask, is_mask=True))
+
+        # The image and mask passes share the keyed frame for the same t.
+        last = _Memo()
+
+        def keyed(get_frame, t):
+            if last.get('t') != t:
+                last['frame'], last['alpha'] = key(get_frame(t))
+                last['t'] = t
+            return last['frame'], last['alpha']
+
+        source = clip
+        new_clip = clip.transform(lambda get_frame, t: keyed(get_frame, t)[0], apply_to=[])
+        if source.mask is None:
+            source = source.with_mask()
+        new_clip.mask = source.mask.transform(
+            lambda get_frame, t: keyed_mask(keyed(source.get_frame, t)[1], get_frame(t) if clip.mask else None)
+        )
+        return new_clip
+
+@functools.lru_cache(maxsize=8)
+def _key_alpha_lut(color, tolerance, softness):
+    """uint8 alpha for every 24-bit colour, indexed by r << 16 | g << 8 | b."""
+    square = lambda c: (np.arange(256, dtype=np.float32) - c) ** 2
+    r2, g2, b2 = (square(c) for c in color)
+    gb2 = np.add.outer(g2, b2).ravel()
+    lut = np.empty(1 << 24, dtype=np.uint8)
+    for r in range(256):
+        distance = np.sqrt(gb2 + r2[r])
+        if softness > 0:
+            alpha = np.clip((distance - tolerance) / softness, 0, 1) * 255 + 0.5
+        else:
+            alpha = (distance > tolerance) * 255
+        lut[r << 16:(r + 1) << 16] = alpha
+    lut.setflags(write=False)
+    return lut
+
+@functools.lru_cache(maxsize=8)
+def _key_spill_lut(spill):
+    """Spill-suppressed key channel, indexed by channel << 8 | limit."""
+    channel, limit = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+    excess = np.maximum(channel - limit, 0)
+    lut = np.rint(channel - spill * excess).astype(np.uint8).ravel()
+    lut.setflags(write=False)
+    return lut
+
+@dataclass
 class Spring(Effect):
     """
     Effect that simulates spring physics to move a clip from one position to another.
     The clip will bounce around the target position before settling.
-    
+
+    The motion is the exact damped harmonic oscillator, evaluated for all
+    frames at once.
+
     Parameters:
     -----------
     from_position : tuple (x,y), optional
         Initial position
     to_position : tuple (x,y), optional
         Target position
-    stiffness : float, optional
+    stiffness : float or tuple (x,y), optional
         Spring stiffness coefficient (higher = stronger spring)
-    damping : float, optional
+    damping : float or tuple (x,y), optional
         Damping factor (higher = more damping, less oscillation)
-    mass : float, optional
+    mass : float or tuple (x,y), optional
         Mass of the object (higher = more inertia)
-    fps : int, optional
-        Frames per second for physics calculation. Higher values give more accurate simulation.
     initial_velocity : tuple (vx, vy), optional
         Initial velocity of the clip
     """
-    
-    def __init__(self, from_position=(0,0), to_position=(0,0), 
-                 stiffness=5.0, damping=0.5, mass=1.0, fps=24, 
-                 initial_velocity=(0,0)):
-        # Store parameters
-        self.from_position = np.array(from_position, dtype=float)
-        self.to_position = np.array(to_position, dtype=float)
-        self.stiffness = stiffness
-        self.damping = damping
-        self.mass = mass
-        self.fps = fps
-        self.initial_velocity = np.array(initial_velocity, dtype=float)
-         
-    def _calculate_positions(self, clip):
-        """Calculate all positions for the spring physics simulation"""
-        # Initialize physics parameters
-        pos = self.from_position.copy()
-        vel = self.initial_velocity.copy()
-        dt = 1.0 / self.fps
-        
-        # Pre-calculate all positions for smoothness
-        t = np.arange(0, clip.duration, dt)
-        positions = []
-        
-        # Run physics simulation
-        for _ in t:
-            # Spring force (Hooke's law): F = -k * (pos - equilibrium)
-            spring_force = self.stiffness * (self.to_position - pos)
-            
-            # Damping force: F = -c * velocity
-            damping_force = -self.damping * vel
-            
-            # Total force
-            force = spring_force + damping_force
-            
-            # Acceleration (F = ma)
-            acc = force / self.mass
-            
-            # Update velocity and position (Euler integration)
-            vel = vel + acc * dt
-            pos = pos + vel * dt
-            
-            positions.append(pos.copy())
-        
-        return np.array(positions)
-    
- 
+    from_position: Tuple[float, float] = (0, 0)
+    to_position: Tuple[float, float] = (0, 0)
+    stiffness: Union[float, Tuple[float, float]] = 5.0
+    damping: Union[float, Tuple[float, float]] = 0.5
+    mass: Union[float, Tuple[float, float]] = 1.0
+    initial_velocity: Tuple[float, float] = (0, 0)
+
     def apply(self, clip):
-        """Apply the effect at time t (required by the Effect class)"""
-        # This method doesn't need to do any transformation since we're using 
-        # the with_position method in make_frame below
-        # The frame transformation happens via the clip's position
-
-        positions = self._calculate_positions(clip)
-
-        def get_position(t):
-            """Get the position at time t"""
-            if t >= clip.duration:
-                return tuple(self.to_position)
-        
-            idx = min(int(t * self.fps), len(positions) - 1)
-            x = min(0, max(1920, positions[idx][0]))
-            y = min(0, max(1080, positions[idx][1]))
-            return int(x), int(y)
-
-        return clip.with_position(get_position)
-    
+        params = [
+            np.broadcast_to(np.asarray(value, dtype=float), (2,))
+            for value in (self.stiffness, self.damping, self.mass)
+        ]
+        if np.any(params[2] <= 0):
+            raise ValueError(f"Spring mass must be positive: {self.mass}")
+        if np.any(params[0] < 0) or np.any(params[1] < 0):
+            raise ValueError(f"Spring stiffness and damping must not be negative: {self.stiffness}, {self.damping}")
+        start = np.asarray(self.from_position, dtype=float)
+        target = np.asarray(self.to_position, dtype=float)
+        velocity = np.asarray(self.initial_velocity, dtype=float)
+
+        def sample(times):
+            times = np.asarray(times, dtype=float)
+            xy = np.empty((len(times), 2))
+            for axis in range(2):
+                stiffness, damping, mass = (float(p[axis]) for p in params)
+                displacement, impulse = _spring_response(stiffness, damping, mass, times)
+                xy[:, axis] = target[axis] + (start[axis] - target[axis]) * displacement + velocity[axis] * impulse
+            return _rows(xy)
+
+        return clip.with_position(Trajectory(sample, clip.duration))
+
+def _spring_response(stiffness, damping, mass, t):
+    """Offsets from rest of a damped spring released from a unit offset,
+    and from rest with a unit velocity, at times `t`."""
+    if stiffness == 0:
+        # No restoring force: the offset stays, and a velocity only decays.
+        rate = damping / mass
+        impulse = t if rate == 0 else -np.expm1(-rate * t) / rate
+        return np.ones_like(t), impulse
+    omega = math.sqrt(stiffness / mass)
+    zeta = damping / (2 * math.sqrt(stiffness * mass))
+    if zeta < 1 - 1e-9:
+        omega_d = omega * math.sqrt(1 - zeta * zeta)
+        decay = np.exp(-zeta * omega * t)
+        cos, sin = np.cos(omega_d * t), np.sin(omega_d * t)
+        displacement = decay * (cos + zeta * omega / omega_d * sin)
+        impulse = decay * sin / omega_d
+    elif zeta > 1 + 1e-9:
+        root = omega * math.sqrt(zeta * zeta - 1)
+        fast, slow = np.exp((-zeta * omega - root) * t), np.exp((-zeta * omega + root) * t)
+        displacement = ((zeta * omega + root) * slow - (zeta * omega - root) * fast) / (2 * root)
+        impulse = (slow - fast) / (2 * root)
+    else:
+        decay = np.exp(-omega * t)
+        displacement = decay * (1 + omega * t)
+        impulse = decay * t
+    return displacement, impulse
+
 
 # Create a convenience function for moviepy's standard fx interface
 def spring(clip, from_position=(0,0), to_position=(0,0), stiffness=5.0, 
-           damping=0.5, mass=1.0, fps=None, initial_velocity=(0,0)):
+           damping=0.5, mass=1.0, initial_velocity=(0,0)):
     """Applies spring effect to the clip"""
-    return Spring(clip, from_position, to_position, stiffness, 
-                 damping, mass, fps, initial_velocity)
+    return clip.with_effects([Spring(from_position, to_position, stiffness,
+                                     damping, mass, initial_velocity)])
+
+def fuse_effects(effects):
+    """Compile runs of geometric effects into single FusedTransform passes.
+
+    Resize, UniformScale, SquishBounceEffect, Swing, Flip without
+    perspective and cross-fades each run over the whole frame. A run of
+    two or more becomes one FusedTransform, which resamples once.
+    FloatAnimation, UniformMotion and Spring only move the clip, so they
+    do not break a run:
+
+        clip.with_effects(fuse_effects([Swing(-2, 2, 1), FloatAnimation(), SquishBounceEffect()]))
+    """
+    compiled, run = [], []
+
+    def flush():
+        if len(run) > 1:
+            compiled.append(FusedTransform(list(run)))
+        else:
+            compiled.extend(run)
+        run.clear()
+
+    for effect in effects:
+        if _fusion_stage_factory(effect) is not None:
+            run.append(effect)
+        elif isinstance(effect, FloatAnimation):
+            # Offsets add, so it commutes with SquishBounceEffect's.
+            compiled.append(effect)
+        elif isinstance(effect, (UniformMotion, Spring)) and not any(isinstance(e, SquishBounceEffect) for e in run):
+            compiled.append(effect)
+        else:
+            flush()
+            compiled.append(effect)
+    flush()
+    return compiled
+
+@dataclass
+class FusedTransform(Effect):
+    """Geometric effects applied as one affine resample per frame, with
+    their opacities multiplied into the mask. See fuse_effects."""
+    effects: List[Effect]
+    resample: int = Image.BICUBIC
+
+    def apply(self, clip):
+        stages, size, scale = [], tuple(clip.size), _proxy_scale(clip)
+        position = Trajectory.of(clip) if any(isinstance(e, SquishBounceEffect) for e in self.effects) else None
+        for effect in self.effects:
+            stage = _fusion_stage_factory(effect)(effect, size, clip.duration, scale)
+            if isinstance(effect, SquishBounceEffect):
+                position = position.offset(effect.offset(*size, scale))
+            stages.append(stage)
+            size = stage(0, size)[0]
+
+        # The image and mask passes share the plan for the same t.
+        last = _Memo()
+
+        def plan(t, in_size):
+            if last.get('key') != (t, in_size):
+                size, matrix, opacity = in_size, np.eye(3), 1.0
+                for stage in stages:
+                    size, forward, alpha = stage(t, size)
+                    if forward is not None:
+                        matrix = forward @ matrix
+                    opacity *= alpha
+                last['key'] = (t, in_size)
+                last['plan'] = (size, matrix, opacity)
+            return last['plan']
+
+        def render(frame, size, matrix):
+            if np.allclose(matrix, np.eye(3)) and size == (frame.shape[1], frame.shape[0]):
+                return frame
+            if abs(np.linalg.det(matrix[:2, :2])) < 1e-9:
+                return np.zeros((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+            image, matrix = _antialiased(Image.fromarray(_as_frame(frame, frame)), matrix)
+            if np.allclose(matrix, np.eye(3)) and size == image.size:
+                out = np.asarray(image)
+            else:
+                inverse = tuple(np.linalg.inv(matrix)[:2].ravel())
+                out = np.asarray(image.transform(size, Image.AFFINE, inverse, self.resample))
+            # Bicubic overshoots; masks must stay within [0, 1].
+            return np.clip(out, 0, 1) if image.mode == 'F' else out
+
+        def make_filter(static, is_mask):
+            def filter(get_frame, t):
+                frame = get_frame(t)
+                size, matrix, opacity = plan(t, (frame.shape[1], frame.shape[0]))
+                if static:
+                    # The matrix and size are all that decide the sprite.
+                    key = ('fused', id(frame), size, tuple(np.round(matrix, 9).ravel()), self.resample)
+                    out, _ = sprite_cache.get(key, lambda: (render(frame, size, matrix), (frame,)))
+                else:
+                    out = render(frame, size, matrix)
+                if is_mask and opacity != 1:
+                    out = out * np.float32(opacity)
+                return out
+            return filter
+
+        source = clip if clip.mask is not None else clip.with_mask()
+        new_clip = clip.transform(make_filter(isinstance(clip, ImageClip), False), apply_to=[])
+        new_clip.mask = source.mask.transform(make_filter(isinstance(source.mask, ImageClip), True))
+        if position is not None:
+            new_clip = new_clip.with_position(position)
+        return new_clip
+
+def _antialiased(image, matrix, limit=1.25):
+    """Shrink `image` by the scale of `matrix`, where it shrinks by more
+    than `limit`, with a Lanczos resize, and return the affine matrix that
+    remains. Affine resampling does not antialias, so large downscales
+    would alias."""
+    w, h = image.size
+    # How much the matrix stretches each input axis.
+    sx, sy = np.hypot(matrix[0, 0], matrix[1, 0]), np.hypot(matrix[0, 1], matrix[1, 1])
+    new_w = max(1, round(w * sx)) if sx * limit < 1 else w
+    new_h = max(1, round(h * sy)) if sy * limit < 1 else h
+    if (new_w, new_h) == (w, h):
+        return image, matrix
+    return image.resize((new_w, new_h), Image.LANCZOS), matrix @ np.diag([w / new_w, h / new_h, 1.0])
+
+def _fusion_stage_factory(effect):
+    """The stage builder for a fusible effect, or None.
+
+    A builder takes the effect, the clip size and duration at the point
+    the effect applies and the clip's preview scale, and returns stage(t, size) -> (size, forward,
+    opacity): the output size, the 3x3 matrix from input to output pixel
+    coordinates (None for identity) and an opacity factor."""
+    if isinstance(effect, (Resize, UniformScale, SquishBounceEffect)):
+        return _resize_stage
+    if isinstance(effect, vfx.Resize) and effect.apply_to_mask:
+        return _resize_stage
+    if isinstance(effect, Swing) and effect.center is None and effect.translate is None and effect.bg_color is None:
+        return _swing_stage
+    if isinstance(effect, Flip) and not effect.perspective:
+        return _flip_stage
+    if isinstance(effect, (vfx.CrossFadeIn, vfx.CrossFadeOut)):
+        return _fade_stage
+    return None
+
+def _resize_stage(effect, size, duration, scale):
+    w, h = size
+    if isinstance(effect, SquishBounceEffect):
+        new_size = lambda t: effect.size_at(w, h, t, scale)
+    elif isinstance(effect, UniformScale):
+        new_size = lambda t: _scaled(effect.to_scale if t >= (effect.duration or duration) else
+                                     effect.from_scale + (effect.to_scale - effect.from_scale) * t / (effect.duration or duration), w, h)
+    elif isinstance(effect, vfx.Resize) and effect.new_size is None:
+        side = effect.height if effect.height is not None else effect.width
+        full = h if effect.height is not None else w
+        new_size = lambda t: _scaled((side(t) if callable(side) else side) * scale / full, w, h)
+    else:
+        new_size = lambda t: _scaled(effect.new_size(t) if callable(effect.new_size) else effect.new_size, w, h, scale)
+
+    def stage(t, size):
+        out_w, out_h = (max(1, int(v)) for v in new_size(t))
+        forward = np.diag([out_w / size[0], out_h / size[1], 1.0])
+        return (out_w, out_h), forward, 1.0
+    return stage
+
+def _scaled(size, w, h, scale=1):
+    """A factor of a w x h clip's size, or a full-resolution size at
+    preview `scale`, as a (width, height)."""
+    if isinstance(size, numbers.Number):
+        return (size * w, size * h)
+    return (size[0] * scale, size[1] * scale)
+
+def _swing_stage(effect, size, duration, scale):
+    mid = (effect.start_angle + effect.end_angle) / 2
+    amplitude = abs(effect.end_angle - effect.start_angle) / 2
+
+    def stage(t, size):
+        angle = mid + amplitude * math.sin((t % effect.period) * (2 * math.pi / effect.period))
+        if effect.unit == "rad":
+            angle = math.degrees(angle)
+        if effect.resolution:
+            angle = round(angle / effect.resolution) * effect.resolution
+        # Rotate about the centre like PIL's rotate, growing the canvas
+        # to fit when expanding.
+        w, h = size
+        cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        rotation = np.array([[cos, sin, 0], [-sin, cos, 0], [0, 0, 1.0]]) @ _translation(-w / 2, -h / 2)
+        if effect.expand:
+            corners = rotation @ np.array([[0, w, w, 0], [0, 0, h, h], [1, 1, 1, 1.0]])
+            w = math.ceil(corners[0].max()) - math.floor(corners[0].min())
+            h = math.ceil(corners[1].max()) - math.floor(corners[1].min())
+        return (w, h), _translation(w / 2, h / 2) @ rotation, 1.0
+    return stage
+
+def _flip_stage(effect, size, duration, scale):
+    axis = 0 if effect.rotation_axis == 'vertical' else 1
+
+    def stage(t, size):
+        step = round(t / effect.duration * _FLIP_STEPS) % _FLIP_STEPS
+        scale = [1.0, 1.0, 1.0]
+        scale[axis] = abs(math.cos(2 * math.pi * step / _FLIP_STEPS))
+        centre = _translation(size[0] / 2, size[1] / 2)
+        return size, centre @ np.diag(scale) @ np.linalg.inv(centre), 1.0
+    return stage
+
+def _fade_stage(effect, size, duration, scale):
+    fade_in = isinstance(effect, vfx.CrossFadeIn)
+    if duration is None:
+        raise ValueError("Attribute 'duration' not set")
+
+    def stage(t, size):
+        remaining = t if fade_in else duration - t
+        opacity = 1.0 if remaining >= effect.duration else max(remaining, 0) / effect.duration
+        return size, None, opacity
+    return stage
+
+def _translation(x, y):
+    return np.array([[1, 0, x], [0, 1, y], [0, 0, 1.0]])
+
+# Frames per second of baked sprite sheets, as Movie.render defaults to.
+# Pass the render's fps when it differs, or the animation steps slower.
+BAKE_FPS = 30
+
+# Clip attributes that place a clip rather than decide its frames.
+_PLACEMENT_ATTRS = ('pos', 'relative_pos', 'start', 'end', 'duration', 'layer_index')
+
+def bake(clip, period, fps=BAKE_FPS, phase=0.0):
+    """Pre-render one `period` seconds of a looping clip into a sprite sheet.
+
+    Returns a clip with the same placement that plays the sheet from
+    `phase` seconds into the period. Clips whose frames come from the same
+    sources and effects share a sheet wherever they are placed, so N
+    copies of an animation, each with its own phase, render one period.
+    Position effects are kept per clip and are not baked.
+    """
+    count = max(1, round(period * fps))
+    try:
+        key = ('bake', _fingerprint(_unplaced(clip)), count, fps)
+    except _Unfingerprintable:
+        key = ('bake', id(clip), count, fps)
+
+    def load():
+        times = [i / fps for i in range(count)]
+        frames = _sprite_sheet([clip.get_frame(t) for t in times], np.uint8)
+        masks = _sprite_sheet([clip.mask.get_frame(t) for t in times], np.float32) if clip.mask else (None, None)
+        # The clip is kept with its sheet so an id key is not reused.
+        return frames + masks + (clip,)
+
+    sheet, sizes, mask_sheet, mask_sizes, _ = asset_cache.get(key, load)
+
+    def cell(sheet, sizes):
+        def frame_function(t):
+            i = round((t + phase) * fps) % count
+            w, h = sizes[i]
+            return sheet[i, :h, :w]
+        return frame_function
+
+    baked = VideoClip(cell(sheet, sizes), duration=clip.duration)
+    if mask_sheet is not None:
+        baked.mask = VideoClip(cell(mask_sheet, mask_sizes), is_mask=True, duration=clip.duration)
+    for attr in _PLACEMENT_ATTRS:
+        setattr(baked, attr, getattr(clip, attr))
+    baked.proxy_scale = _proxy_scale(clip)
+    return baked
+
+def _unplaced(clip):
+    """A copy of `clip`, and of its mask, with the placement attributes
+    cleared. Clips it was made from keep theirs, as they can decide its
+    frames, e.g. the duration of an effect."""
+    unplaced = copy.copy(clip)
+    for attr in _PLACEMENT_ATTRS:
+        setattr(unplaced, attr, None)
+    if clip.mask is not None:
+        unplaced.mask = _unplaced(clip.mask)
+    return unplaced
+
+def _sprite_sheet(frames, dtype):
+    """Frames of varying size, packed top-left into one (n, h, w, ...)
+    array, with each frame's (w, h)."""
+    sizes = np.array([(frame.shape[1], frame.shape[0]) for frame in frames])
+    sheet = np.zeros((len(frames), sizes[:, 1].max(), sizes[:, 0].max()) + frames[0].shape[2:], dtype=dtype)
+    for cell, frame in zip(sheet, frames):
+        cell[:frame.shape[0], :frame.shape[1]] = frame
+    return sheet, sizes
 
 def paste_non_transparent(image_a, image_b, position=(0, 0)):
     """
@@ -564,30 +2125,57 @@ def paste_non_transparent(image_a, image_b, position=(0, 0)):
 
     Args:
         image_a: The source image (PIL Image object).
-        image_b: The destination image (PIL Image object).
+        image_b: The destination image (PIL Image object), updated in place.
         position: The (x, y) coordinates where to paste image_a onto image_b.
     """
+    return stamp_many(image_b, [(image_a, position)], blend=False)
 
-    if image_a.mode != "RGBA":
-        image_a = image_a.convert("RGBA")  # Ensure image_a has an alpha channel
-
-    if image_b.mode != "RGBA":
-        image_b = image_b.convert("RGBA")  # Ensure image_b has an alpha channel
-
-    width_a, height_a = image_a.size
-    x_offset, y_offset = position
-
-    for x in range(width_a):
-        for y in range(height_a):
-            r, g, b, a = image_a.getpixel((x, y))
-
-            if a > 0:  # If pixel is not fully transparent
-                # Calculate position in image_b, handling potential out-of-bounds
-                x_b = x + x_offset
-                y_b = y + y_offset
+def stamp_many(dest, stamps, blend=True):
+    """
+    Stamps many sprites onto dest in one pass, in order.
 
-                if 0 <= x_b < image_b.width and 0 <= y_b < image_b.height:  # Check bounds
-                    image_b.putpixel((x_b, y_b), (r, g, b, a))
+    Args:
+        dest: The destination, a PIL Image or an HxWx4 uint8 array, updated in place.
+        stamps: (sprite, (x, y)) pairs; sprites are PIL Images or HxWx3/4 uint8 arrays.
+            Sprites may hang over the edges of dest.
+        blend: Alpha-composite sprites over dest. Otherwise their non-transparent
+            pixels replace dest's, like paste_non_transparent.
+    """
+    is_image = isinstance(dest, Image.Image)
+    canvas = np.array(dest.convert('RGBA')) if is_image else dest
+    height, width = canvas.shape[:2]
+
+    for sprite, (x, y) in stamps:
+        sprite = _rgba_array(sprite)
+        x, y = int(x), int(y)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sprite.shape[1], width), min(y + sprite.shape[0], height)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        src = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+        dst = canvas[y0:y1, x0:x1]
+        if not blend:
+            np.copyto(dst, src, where=src[..., 3:] > 0)
+            continue
+        alpha = src[..., 3:].astype(np.float32) / 255
+        dst_alpha = dst[..., 3:].astype(np.float32) / 255 * (1 - alpha)
+        out_alpha = alpha + dst_alpha
+        color = src[..., :3] * alpha + dst[..., :3] * dst_alpha
+        color /= np.maximum(out_alpha, np.float32(1e-6))
+        dst[..., :3] = np.rint(color)
+        dst[..., 3:] = np.rint(out_alpha * 255)
+
+    if is_image:
+        result = Image.fromarray(canvas)
+        dest.paste(result if dest.mode == 'RGBA' else result.convert(dest.mode))
+    return dest
+
+def _rgba_array(sprite):
+    if isinstance(sprite, Image.Image):
+        return np.asarray(sprite if sprite.mode == 'RGBA' else sprite.convert('RGBA'))
+    if sprite.shape[2] == 3:
+        return np.dstack([sprite, np.full(sprite.shape[:2], 255, dtype=np.uint8)])
+    return sprite
 
 
 def anchor_center(box_top_left_x, box_top_left_y, box_width, box_height, width, height):
@@ -3,6 +3,7 @@ from PIL import Image
 from tempfile import NamedTemporaryFile
 from moviepy import *
 from pathlib import Path
+from vima5.canva import asset_size, video_clip
 
 # Create assets directory if it doesn't exist
 Path("assets").mkdir(exist_ok=True)
@@ -67,11 +68,10 @@ def create_quiz_video(image_path, title, title_bg_color, answer_box, title_color
     ).with_position(('center', 50)).with_duration(15)
     
     # Load highlight gif
-    highlight = VideoFileClip("assets/highlight.gif", has_mask=True)
-    highlight_scale_factor = (answer_box['bottom'] - answer_box['top']) / highlight.size[1] * image_scale
+    highlight_scale_factor = (answer_box['bottom'] - answer_box['top']) / asset_size("assets/highlight.gif")[1] * image_scale
     highlight_scale_factor = 1.0 if highlight_scale_factor == 0.0 else highlight_scale_factor
     # Calculate scale based on points
-    highlight = highlight.with_effects([vfx.Resize(highlight_scale_factor)])
+    highlight = video_clip("assets/highlight.gif", highlight_scale_factor, has_mask=True)
     highlight_duration = 5
     highlight_loop_count = int(highlight_duration // highlight.duration + 1)
     highlight = concatenate_videoclips([highlight] * highlight_loop_count).with_duration(highlight_duration)
@@ -135,11 +135,10 @@ def create_quiz_video_set(
         ).with_position(('center', 50)).with_duration(15).with_start(index * 15)
     
         # Load highlight gif
-        highlight = VideoFileClip("assets/highlight.gif", has_mask=True)
-        highlight_scale_factor = (answer_box['bottom'] - answer_box['top']) / highlight.size[1] * image_scale
+        highlight_scale_factor = (answer_box['bottom'] - answer_box['top']) / asset_size("assets/highlight.gif")[1] * image_scale
         highlight_scale_factor = 1.0 if highlight_scale_factor == 0.0 else highlight_scale_factor
         # Calculate scale based on points
-        highlight = highlight.with_effects([vfx.Resize(highlight_scale_factor)])
+        highlight = video_clip("assets/highlight.gif", highlight_scale_factor, has_mask=True)
         highlight_duration = 5
         highlight_loop_count = int(highlight_duration // highlight.duration + 1)
         highlight = concatenate_videoclips([highlight] * highlight_loop_count).with_duration(highlight_duration)
@@ -46,6 +46,7 @@ from typing import List, Dict
 import numpy as np
 from PIL import Image
 from vima5.utils import get_asset_path, get_build_path
+from vima5.canva import Resize, RemoveColor
 from moviepy import *
 logger = logging.getLogger(__name__)
 
@@ -257,7 +258,7 @@ def get_character(config, duration):
     character = (
         character
         .with_position(character_pos_animation)
-        .with_effects([vfx.Resize(character_scale_animation)])
+        .with_effects([Resize(character_scale_animation)])
     )
     return character
 
@@ -293,7 +294,7 @@ def make_ack_scene(args):
             .with_position('center')
             .with_duration(config.ack_scene['min_duration'])
             .with_effects([
-                vfx.MaskColor((0, 252, 20), 50, 2),
+                RemoveColor((0, 252, 20), tolerance=10, softness=80, spill=0.5),
                 vfx.Resize((500, 500))
                 ]) # assume it's 1:1
         )
@@ -77,11 +77,11 @@ import sys
 import logging
 import random
 from dataclasses import dataclass, field
-from rembg import remove as rembg
 from typing import List, Dict
 import numpy as np
 from PIL import Image
-from vima5.utils import get_asset_path, get_build_path, mask_alpha, make_rembg
+from vima5.utils import get_asset_path, get_build_path, mask_alpha, make_rembgs
+from vima5.canva import Resize
 from moviepy import *
 logger = logging.getLogger(__name__)
 
@@ -144,11 +144,11 @@ def make_video(args):
     background = get_background_clip(config)
 
     # Create black and rembg image for all choices.
-    for choice in config.choices + [config.character_image]:
-        if (os.path.exists(get_build_path(choice.replace('.png', '_black.png'))) and
-            os.path.exists(get_build_path(choice.replace('.png', '_rembg.png')))):
-            continue
-        make_rembg(choice)
+    make_rembgs([
+        choice for choice in config.choices + [config.character_image]
+        if not (os.path.exists(get_build_path(choice.replace('.png', '_black.png'))) and
+                os.path.exists(get_build_path(choice.replace('.png', '_rembg.png'))))
+    ])
 
     # Create outline image from character image
     outline = ImageClip(get_build_path(config.character_image.replace('.png', '_black.png')))
@@ -168,7 +168,7 @@ def make_video(args):
         return scale
     question_mark = (question_text
                      .with_position('center')
-                     .with_effects([vfx.Resize(pulse_scale)]))
+                     .with_effects([Resize(pulse_scale)]))
 
     # Create answer cohice popup
     choice_icon_clips = []
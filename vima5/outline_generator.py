@@ -7,13 +7,13 @@ $ python vima5/outline_generator.py /path/to/images
 import sys
 import os
 
-from PIL import Image
-from rembg import remove as rembg
-
-from vima5.utils import mask_alpha
+from vima5.bgremoval import remove_backgrounds
+from vima5.utils import mask_alpha_many
 
 def main():
     datadir = sys.argv[1]
+    images = []
+    masks = []
     for file in os.listdir(datadir):
         if not file.endswith(".png"):
             continue
@@ -22,16 +22,16 @@ def main():
         black_path = datadir + '/build/' + file.replace('.png', '_black.png')
 
         if not os.path.exists(rembg_path):
-            image = Image.open(datadir + '/' + file).convert("RGBA")
-            rembg_image = rembg(image)
-            rembg_image.save(rembg_path)
-
-        if not os.path.exists(black_path):
-            mask_alpha(rembg_path, black_path,
-                translucency_mask_color=(0, 0, 0),
-                transparent_mask_color=(0, 0, 0, 0),
-                opacity_mask_color=(0, 0, 0),
-            )
+            images.append((datadir + '/' + file, rembg_path))
+        masks.append((rembg_path, black_path))
+
+    remove_backgrounds(images)
+
+    mask_alpha_many(masks,
+        translucency_mask_color=(0, 0, 0),
+        transparent_mask_color=(0, 0, 0, 0),
+        opacity_mask_color=(0, 0, 0),
+    )
 
 
 if __name__ == '__main__':
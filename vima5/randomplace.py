@@ -3,6 +3,7 @@ import numpy as np
 import random
 from PIL import Image
 import math
+from vima5.canva import stamp_many
 
 def distribute_images(bg_width, bg_height, num_images, min_scale=0.5, max_scale=1.0, 
                       max_attempts=1000, coverage_target=0.99, three_pass=True):
@@ -339,6 +340,7 @@ def place_images_on_background(bg_image_path, transparent_images, output_path,
     #transparent_images = transparent_images[:len(placements)]
     
     # Place each image on the background
+    stamps = []
     for i, (image_path, (x, y, scale)) in enumerate(zip(transparent_images, placements)):
         # Load the transparent image
         img = Image.open(image_path).convert("RGBA")
@@ -350,9 +352,10 @@ def place_images_on_background(bg_image_path, transparent_images, output_path,
         # Resize the image
         img_resized = img.resize((new_width, new_height), Image.LANCZOS)
         
-        # Paste the transparent image onto the background
-        # The mask is used to preserve transparency
-        bg.paste(img_resized, (x, y), img_resized)
+        stamps.append((img_resized, (x, y)))
+
+    # Alpha-composite all images onto the background in one pass
+    stamp_many(bg, stamps)
     
     # Save the result
     bg.save(output_path)
@@ -1,17 +1,26 @@
+import atexit
 import hashlib
 from pathlib import Path
 import os
 import json
+import queue
+import threading
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from streamlit_local_storage import LocalStorage
 from datetime import datetime
 from openai import OpenAI
-from rembg import remove as rembg
 from tempfile import NamedTemporaryFile
 import numpy as np
 from PIL import Image, ImageFont
+from PIL.PngImagePlugin import PngInfo
 from elevenlabs.client import ElevenLabs
 from elevenlabs import save as save_voiceover
 import diskcache as dc
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
 
 import streamlit as st
 
@@ -203,14 +212,104 @@ def display_sidebar():
         openai_key = st.text_input("OpenAI API Key", type="password", value=env_openai_api_key or '')
         st.session_state.openai_key = openai_key
 
-def get_asset_path(path):
-    if not os.environ.get('ASSET_PATH'):
+class AssetIndex:
+    """Where assets are, across the search roots of an ASSET_PATH.
+
+    Each directory is listed once, on first lookup, and resolved names are
+    memoized, so repeated lookups are a dict hit and a stat. A miss, or a
+    memoized path that is gone, rescans the listed directories that changed
+    since, so assets created, moved or removed mid-run are found. Call
+    `invalidate_assets` after shadowing assets."""
+
+    def __init__(self, roots):
+        self.roots = [Path(root) for root in roots]
+        self._resolved = {}
+        # Directory listings, by directory, as (mtime_ns, names).
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, path):
+        key = os.fspath(path)
+        resolved = self._resolved.get(key)
+        if resolved is not None and resolved.exists():
+            return resolved
+
+        with self._lock:
+            if self._resolved.pop(key, None) is not None:
+                # Gone since it was resolved: its listing is stale too.
+                self._refresh()
+            resolved = self._find(path)
+            if resolved is None and self._refresh():
+                resolved = self._find(path)
+        if resolved is None:
+            raise Exception(f'Asset not found: {path}')
+        self._resolved[key] = resolved
+        return resolved
+
+    def _find(self, path):
+        relative = Path(path)
+        if relative.is_absolute() or '..' in relative.parts or not relative.name:
+            # Not a name within the roots: look it up as before.
+            for root in self.roots:
+                if root.joinpath(path).exists():
+                    return root.joinpath(path)
+            return None
+
+        for root in self.roots:
+            if relative.name in self._names(root / relative.parent):
+                return root.joinpath(path)
+        return None
+
+    def _names(self, directory):
+        if directory not in self._listings:
+            self._listings[directory] = self._list(directory)
+        return self._listings[directory][1]
+
+    def _list(self, directory):
+        try:
+            return os.stat(directory).st_mtime_ns, frozenset(os.listdir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return None, frozenset()
+
+    def _refresh(self):
+        """Rescan changed directories. Returns whether any had."""
+        changed = False
+        for directory, (mtime, _) in list(self._listings.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                current = None
+            if current != mtime:
+                self._listings[directory] = self._list(directory)
+                changed = True
+        if changed:
+            self._resolved.clear()
+        return changed
+
+# Indexes of each ASSET_PATH seen by this process, see `asset_index`.
+_asset_indexes = {}
+
+def asset_index():
+    """The `AssetIndex` of the current ASSET_PATH."""
+    asset_path = os.environ.get('ASSET_PATH')
+    if not asset_path:
         raise Exception('ASSET_PATH not set')
-    search_paths = os.environ['ASSET_PATH'].split(',')
-    for search_path in search_paths:
-        if Path(search_path).joinpath(path).exists():
-            return Path(search_path).joinpath(path)
-    raise Exception(f'Asset not found: {path}')
+    index = _asset_indexes.get(asset_path)
+    if index is None:
+        index = _asset_indexes[asset_path] = AssetIndex(asset_path.split(','))
+    return index
+
+def invalidate_assets():
+    """Forget every asset index, after assets were removed or replaced."""
+    _asset_indexes.clear()
+
+def get_asset_path(path):
+    return asset_index().resolve(path)
+
+def resolve_many(paths):
+    """`get_asset_path` of each of `paths`, in order."""
+    index = asset_index()
+    return [index.resolve(path) for path in paths]
 
 def get_build_path(path):
     if os.environ.get('BUILD_PATH'):
@@ -225,10 +324,118 @@ def save_mp4(clip, path, fps=24):
     with NamedTemporaryFile(suffix='.m4a') as f:
         clip.write_videofile(path, fps=fps, codec="libx264",
                              temp_audiofile=f.name,
-                             remove_temp=True,
+                             remove_temp=False,
                              audio_codec="aac",
                              threads=4)
 
+def save_mp4_frames(clip, path, fps, start_frame, end_frame, threads=4):
+    """Encode frames [start_frame, end_frame) of a clip, without audio.
+
+    Uses the same video settings and frame times (`frame_index / fps`) as
+    `save_mp4`, so segments written this way can be joined by `concat_mp4`
+    into the file `save_mp4` would have produced.
+    """
+    has_mask = clip.mask is not None
+    with FFMPEG_VideoWriter(path, clip.size, fps, codec="libx264",
+                            with_mask=has_mask, threads=threads) as writer:
+        for frame_index in range(start_frame, end_frame):
+            writer.write_frame(encoder_frame(clip, frame_index / fps, has_mask))
+
+def save_mp4_pipelined(clip, path, fps=24, queue_size=8, threads=4):
+    """Encode a clip like `save_mp4`, compositing ahead of the encoder.
+
+    A producer thread renders frames into a bounded queue while this thread
+    writes the raw buffers to ffmpeg's stdin, so compositing and x264
+    encoding overlap and at most `queue_size` frames are held in memory.
+    """
+    has_mask = clip.mask is not None
+    frames = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        # Give up once the consumer has stopped, instead of blocking forever
+        # on a full queue.
+        while not stopped.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for frame_index in range(int(clip.duration * fps)):
+                if not put(encoder_frame(clip, frame_index / fps, has_mask)):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    def consume():
+        while (frame := frames.get()) is not done:
+            if isinstance(frame, BaseException):
+                raise frame
+            yield frame
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        save_mp4_from_frames(clip, path, fps, consume(), threads=threads)
+    finally:
+        stopped.set()
+        producer.join()
+
+def save_mp4_from_frames(clip, path, fps, frames, threads=4):
+    """Encode a clip like `save_mp4`, from frames rendered elsewhere.
+
+    `frames` yields `encoder_frame(clip, frame_index / fps, ...)` for every
+    frame index in order.
+    """
+    with NamedTemporaryFile(suffix='.m4a') as f:
+        audiofile = None
+        if clip.audio is not None:
+            save_m4a(clip, f.name)
+            audiofile = f.name
+
+        with FFMPEG_VideoWriter(path, clip.size, fps, codec="libx264",
+                                audiofile=audiofile, with_mask=clip.mask is not None,
+                                threads=threads) as writer:
+            for frame in frames:
+                writer.write_frame(frame)
+
+def encoder_frame(clip, t, has_mask):
+    """The frame of a clip at `t`, as uint8 RGB, or RGBA with `has_mask`."""
+    frame = clip.get_frame(t)
+    if frame.dtype != 'uint8':
+        frame = frame.astype('uint8')
+    if has_mask:
+        mask = 255 * clip.mask.get_frame(t)
+        if mask.dtype != 'uint8':
+            mask = mask.astype('uint8')
+        frame = np.dstack([frame, mask])
+    return frame
+
+def save_m4a(clip, path):
+    """Encode the audio of a clip the way `save_mp4` does."""
+    clip.audio.write_audiofile(path, fps=44100, nbytes=4, codec="aac")
+
+def concat_mp4(paths, output, audiofile=None):
+    """Join mp4 segments with identical codec settings by stream copy."""
+    with NamedTemporaryFile('w', suffix='.txt') as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        f.flush()
+
+        cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', f.name]
+        if audiofile:
+            cmd += ['-i', audiofile, '-map', '0:v', '-map', '1:a']
+        cmd += ['-c', 'copy', str(output)]
+        subprocess.run(cmd, check=True)
+
 def blacken_image(image):
   """
   Given a PIL.Image, return a new PIL.Image with black color 
@@ -259,6 +466,9 @@ def blacken_image(image):
 
   return new_image
 
+# PNG text key of the SHA-256 of the image a mask was made from.
+MASK_SOURCE_KEY = 'vima5:mask-source-sha256'
+
 def mask_alpha(input_image_path, output_mask_path, 
                     transparent_mask_color=(255, 255, 255, 0),
                     translucency_mask_color=(0, 0, 0),
@@ -273,31 +483,65 @@ def mask_alpha(input_image_path, output_mask_path,
         translucency_mask_color (tuple): RGB color for semi-transparent pixels.
         opacity_mask_color (tuple): RGB color for fully opaque pixels.
     """
-    # Open the input image
-    image = Image.open(input_image_path).convert("RGBA")
-    width, height = image.size
-
-    # Create a new image for the alpha mask
-    alpha_mask = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-    pixels = image.load()
-    mask_pixels = alpha_mask.load()
-
-    for y in range(height):
-        for x in range(width):
-            r, g, b, a = pixels[x, y]  # Get the RGBA values
-
-            if a == 0:
-                # Fully transparent
-                mask_pixels[x, y] = transparent_mask_color
-            elif 0 < a < 255:
-                # Semi-transparent
-                mask_pixels[x, y] = translucency_mask_color + (255,)
-            else:
-                # Fully opaque
-                mask_pixels[x, y] = opacity_mask_color + (255,)
+    alpha = np.asarray(Image.open(input_image_path).convert("RGBA"))[..., 3]
+
+    # Every pixel takes one of the three colors, by its alpha.
+    colors = np.array([
+        _rgba(transparent_mask_color),
+        tuple(translucency_mask_color[:3]) + (255,),
+        tuple(opacity_mask_color[:3]) + (255,),
+    ], dtype=np.uint8)
+    kind = np.select([alpha == 0, alpha < 255], [0, 1], default=2).astype(np.uint8)
+
+    # The source's hash lets `mask_alpha_many` tell it's up to date.
+    info = PngInfo()
+    info.add_text(MASK_SOURCE_KEY, _file_sha256(input_image_path))
+    # Masks are build artifacts: favour encoding speed over size.
+    Image.fromarray(colors[kind]).save(output_mask_path, "PNG", pnginfo=info, compress_level=1)
+
+def mask_alpha_many(jobs, workers=8, **colors):
+    """`mask_alpha` for many (input_image_path, output_mask_path) pairs.
+
+    Masks are made concurrently in up to `workers` threads, as decoding,
+    encoding and numpy all release the GIL, and skipped if they are newer
+    than their image or were made from identical content. `colors` are
+    passed to `mask_alpha`. Returns the masks made."""
+    jobs = [(src, dst) for src, dst in jobs if not _mask_up_to_date(src, dst)]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        for _ in pool.map(lambda job: mask_alpha(*job, **colors), jobs):
+            pass
+    return [dst for _, dst in jobs]
+
+def mask_alpha_dir(input_dir, output_dir=None, suffix='_black', workers=8, **colors):
+    """`mask_alpha` for every PNG in `input_dir`, see `mask_alpha_many`.
+
+    Masks are saved in `output_dir`, by default `input_dir`, named after
+    their image plus `suffix`. Images that are themselves masks are
+    skipped."""
+    output_dir = output_dir or input_dir
+    jobs = []
+    for file in sorted(os.listdir(input_dir)):
+        name, ext = os.path.splitext(file)
+        if ext.lower() != '.png' or name.endswith(suffix):
+            continue
+        jobs.append((os.path.join(input_dir, file), os.path.join(output_dir, name + suffix + '.png')))
+    return mask_alpha_many(jobs, workers=workers, **colors)
+
+def _mask_up_to_date(src, dst):
+    try:
+        if os.path.getmtime(dst) >= os.path.getmtime(src):
+            return True
+        with Image.open(dst) as mask:
+            return mask.info.get(MASK_SOURCE_KEY) == _file_sha256(src)
+    except OSError:
+        return False
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-    # Save the alpha mask
-    alpha_mask.save(output_mask_path, "PNG")
+def _rgba(color):
+    return tuple(color) if len(color) == 4 else tuple(color) + (255,)
 
 class Animation:
 
@@ -313,13 +557,19 @@ class Animation:
 
 
 def make_rembg(image):
-    image_path = get_asset_path(image)
-    black_path = get_build_path(os.path.splitext(os.path.basename(image))[0] + "_black.png")
-    rembg_path = get_build_path(os.path.splitext(os.path.basename(image))[0] + "_rembg.png")
-    image = Image.open(image_path).convert("RGBA")
-    rembg_image = rembg(image)
-    rembg_image.save(rembg_path)
-    mask_alpha(rembg_path, black_path,
+    make_rembgs([image])
+
+def make_rembgs(images):
+    """Make the `_rembg.png` and `_black.png` build files of asset images."""
+    from vima5.bgremoval import remove_backgrounds
+
+    names = [os.path.splitext(os.path.basename(image))[0] for image in images]
+    remove_backgrounds(
+        (get_asset_path(image), get_build_path(name + "_rembg.png"))
+        for image, name in zip(images, names)
+    )
+    mask_alpha_many(
+        [(get_build_path(name + "_rembg.png"), get_build_path(name + "_black.png")) for name in names],
         translucency_mask_color=(0, 0, 0),
         transparent_mask_color=(0, 0, 0, 0),
         opacity_mask_color=(0, 0, 0),
@@ -346,35 +596,225 @@ VOICES = {
     'Arthur': 'TtRFBnwQdH1k01vR0hMz', # default
 }
 TTS_MODEL = 'eleven_flash_v2_5'
+# Voiceovers synthesized before `voiceover_cache`, read to migrate them.
 cache = dc.Cache(directory='.cache')
 
+# Where voiceovers are kept, and how many bytes of them.
+VOICEOVER_CACHE_DIR = os.environ.get('VOICEOVER_CACHE_DIR', '.cache/voiceovers')
+VOICEOVER_CACHE_BYTES = int(os.environ.get('VOICEOVER_CACHE_BYTES', 1 << 30))
+
+
+class AudioCache:
+    """A size-bounded, content-addressed store of audio files.
+
+    Files are named by key, a hex digest, in `directory`, next to an index
+    of their size, duration and last use. Hits are hard-linked out instead
+    of copied, and the least recently used files are evicted past
+    `max_bytes`. Processes sharing the directory merge their indexes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.mp3')
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _index(self):
+        if self._entries is None:
+            self._entries = self._read_index()
+            atexit.register(self.flush)
+        return self._entries
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index() and os.path.exists(self._path(key))
+
+    def get(self, key, filename):
+        """The file for `key` linked at `filename`, or None on a miss.
+
+        If `filename` is on another device the cached file itself is
+        returned."""
+        path = self._path(key)
+        with self._lock:
+            entry = self._index().get(key)
+            if entry is None or not os.path.exists(path):
+                return None
+            entry['used'] = time.time()
+            self._dirty = True
+        return _link(path, filename)
+
+    def put(self, key, src):
+        """Move the audio file `src`, on the cache's device, in as `key`."""
+        entry = {
+            'bytes': os.path.getsize(src),
+            'duration': ffmpeg_parse_infos(src)['duration'],
+            'used': time.time(),
+        }
+        os.replace(src, self._path(key))
+        with self._lock:
+            self._index()[key] = entry
+            self._evict(keep=key)
+            self._save()
+
+    def duration(self, key):
+        """The duration of `key` in seconds, or None if it isn't cached."""
+        with self._lock:
+            entry = self._index().get(key)
+        return entry['duration'] if entry else None
+
+    def flush(self):
+        """Write out last-use times of hits."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _evict(self, keep):
+        entries = self._index()
+        nbytes = sum(entry['bytes'] for entry in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key]['used']):
+            if nbytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            nbytes -= entries.pop(key)['bytes']
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _save(self):
+        # Entries other processes added since we read the index are kept,
+        # and entries whose files were evicted by anyone are dropped.
+        entries = self._index()
+        for key, entry in self._read_index().items():
+            if key not in entries or entries[key]['used'] < entry['used']:
+                entries[key] = entry
+        for key in [key for key in entries if not os.path.exists(self._path(key))]:
+            del entries[key]
+
+        with NamedTemporaryFile('w', dir=self.directory, suffix='.json', delete=False) as f:
+            json.dump(entries, f)
+        os.replace(f.name, self._index_path())
+        self._dirty = False
+
+
+def _link(path, filename):
+    """Hard-link `path` at `filename`, replacing it, where possible."""
+    try:
+        if os.path.samefile(path, filename):
+            return filename
+    except FileNotFoundError:
+        pass
 
-def make_voiceover(txt, voice='Arthur', model=TTS_MODEL):
-    """Text to speech using Eleven, then save to a file."""
-    hash = hashlib.md5(txt.encode()).hexdigest()
-    suffix = txt[:10].replace(' ', '_').replace('\n', '_').replace(',', '_').replace('.', '_').replace('?', '_').replace('!', '_')
-    cache_key = f'{voice}_{model}_{hash}_{suffix}'
-    filename = f'/tmp/{cache_key}.mp3'
+    partial = f'{filename}.{os.getpid()}.{threading.get_ident()}'
+    try:
+        os.link(path, partial)
+    except OSError:
+        return path
+    os.replace(partial, filename)
+    return filename
 
-    if os.path.exists(filename):
-        return filename
+voiceover_cache = AudioCache(VOICEOVER_CACHE_DIR, VOICEOVER_CACHE_BYTES)
 
-    if cache.get(cache_key):
-        with open(filename, 'wb') as f:
-            f.write(cache.get(cache_key))
-        return filename
 
-    client = ElevenLabs()
-    audio = client.generate(text=txt, voice=VOICES[voice], model=TTS_MODEL)
-    with open(filename, 'wb') as f:
-        save_voiceover(audio, f.name)
+# Voiceovers being synthesized, by key, so that concurrent requests for the
+# same line share one TTS call.
+_voiceovers_lock = threading.Lock()
+_voiceovers_in_flight = {}
 
-    if os.stat(filename).st_size == 0:
-        os.remove(filename)
-        raise ValueError('Voiceover is empty. Please try again.')
+def voiceover_key(txt, voice='Arthur', model=TTS_MODEL):
+    """The SHA-256 naming the voiceover of `txt` in `voiceover_cache`."""
+    return hashlib.sha256(json.dumps([txt, voice, model]).encode()).hexdigest()
 
-    with open(filename, 'rb') as f:
-        audio = f.read()
-        cache.set(cache_key, audio)
+def make_voiceover(txt, voice='Arthur', model=TTS_MODEL):
+    """Text to speech using Eleven, then save to a file."""
+    key = voiceover_key(txt, voice, model)
+    filename = f'/tmp/{key}.mp3'
+
+    with _voiceovers_lock:
+        future = _voiceovers_in_flight.get(key)
+        if future is None:
+            hit = voiceover_cache.get(key, filename)
+            if hit:
+                return hit
+            future = _voiceovers_in_flight[key] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return future.result()
 
-    return filename
+    try:
+        future.set_result(_synthesize_voiceover(txt, voice, model, key, filename))
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _voiceovers_lock:
+            del _voiceovers_in_flight[key]
+    return future.result()
+
+def voiceover_duration(filename):
+    """The duration in seconds of a file from `make_voiceover`, from the
+    cache index when it's there rather than by probing the file."""
+    duration = voiceover_cache.duration(Path(filename).stem)
+    if duration is None:
+        duration = ffmpeg_parse_infos(filename)['duration']
+    return duration
+
+def make_voiceovers(lines, workers=8):
+    """Text to speech for many lines at once.
+
+    `lines` holds (text, voice) or (text, voice, model) tuples, e.g. every
+    line a movie needs. Duplicates are synthesized once and the cache
+    misses concurrently, in up to `workers` threads. Returns the files in
+    the order of `lines`.
+    """
+    lines = [tuple(line) for line in lines]
+    unique = list(dict.fromkeys(lines))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique)))) as pool:
+        files = dict(zip(unique, pool.map(lambda line: make_voiceover(*line), unique)))
+    return [files[line] for line in lines]
+
+def _legacy_voiceover_key(txt, voice, model):
+    hash = hashlib.md5(txt.encode()).hexdigest()
+    suffix = txt[:10].replace(' ', '_').replace('\n', '_').replace(',', '_').replace('.', '_').replace('?', '_').replace('!', '_')
+    return f'{voice}_{model}_{hash}_{suffix}'
+
+def _synthesize_voiceover(txt, voice, model, key, filename):
+    # Written next to the cache so that it can be moved in, never partially.
+    os.makedirs(VOICEOVER_CACHE_DIR, exist_ok=True)
+    with NamedTemporaryFile(dir=VOICEOVER_CACHE_DIR, suffix='.mp3', delete=False) as f:
+        partial = f.name
+    os.chmod(partial, 0o644)
+
+    try:
+        audio = cache.get(_legacy_voiceover_key(txt, voice, model))
+        if audio:
+            with open(partial, 'wb') as f:
+                f.write(audio)
+        else:
+            client = ElevenLabs()
+            audio = client.generate(text=txt, voice=VOICES[voice], model=model)
+            save_voiceover(audio, partial)
+
+        if os.stat(partial).st_size == 0:
+            raise ValueError('Voiceover is empty. Please try again.')
+        voiceover_cache.put(key, partial)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    return voiceover_cache.get(key, filename)